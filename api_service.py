@@ -0,0 +1,240 @@
+import gzip
+import json
+import base64
+
+from sqlalchemy import func, and_, or_
+
+from models import Audio, Video, CountryCategory
+from catalogue_service import unicode_lower
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, без него отдаём gzip
+    brotli = None
+
+
+# ==== Настройки ====
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+COMPRESS_MIN_BYTES = 1024
+
+AUDIO_FIELDS = ("id", "filename", "original_name", "url", "artist", "genre", "price", "thumb_url", "category_id",
+                "duration", "waveform", "preview_url")
+VIDEO_FIELDS = ("id", "filename", "original_name", "url", "title", "category_id")
+CATEGORY_FIELDS = ("id", "name", "audio_count", "video_count")
+
+# ==== Список медиа в админке ====
+ADMIN_MEDIA = {
+    "audio": (Audio, ("id", "filename", "original_name", "url", "artist", "genre", "price", "category_id")),
+    "video": (Video, ("id", "filename", "original_name", "url", "title", "category_id")),
+}
+# Сортировки: NULL приводим к "" / 0, чтобы курсор (значение, id) был однозначным
+ADMIN_SORTS = {
+    "audio": {
+        "id": Audio.id,
+        "filename": Audio.filename,
+        "artist": func.coalesce(Audio.artist, ""),
+        "price": func.coalesce(Audio.price, 0),
+    },
+    "video": {
+        "id": Video.id,
+        "filename": Video.filename,
+        "title": func.coalesce(Video.title, ""),
+    },
+}
+
+
+class ApiError(Exception):
+    pass
+
+
+# ==== Курсор (keyset по id) ====
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise ApiError("Неверный курсор")
+
+
+def encode_sort_cursor(value, last_id):
+    """Курсор для сортировки не по id: (значение сортировки, id)"""
+    raw = json.dumps([value, last_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_sort_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return value, int(last_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ApiError("Неверный курсор")
+
+
+def parse_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError:
+        raise ApiError("Неверный limit")
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def parse_fields(value, allowed):
+    """Выборочные поля: ?fields=filename,artist"""
+    if not value:
+        return allowed
+    fields = tuple(f.strip() for f in value.split(",") if f.strip())
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ApiError(f"Неизвестные поля: {', '.join(unknown)}")
+    # id нужен для курсора
+    return fields if "id" in fields else ("id",) + fields
+
+
+# ==== Выборки ====
+def _page(query, model, columns, after, limit):
+    if after is not None:
+        query = query.filter(model.id > after)
+    rows = query.with_entities(*[getattr(model, c) for c in columns]) \
+        .order_by(model.id).limit(limit + 1).all()
+
+    items = [dict(zip(columns, row)) for row in rows[:limit]]
+    next_cursor = encode_cursor(items[-1]["id"]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def _media_filters(query, model, args):
+    category_id = args.get("category_id")
+    if category_id == "none":
+        query = query.filter(model.category_id.is_(None))
+    elif category_id:
+        try:
+            query = query.filter(model.category_id == int(category_id))
+        except ValueError:
+            raise ApiError("Неверный category_id")
+    return query
+
+
+def list_audios(args):
+    fields = parse_fields(args.get("fields"), AUDIO_FIELDS)
+    query = _media_filters(Audio.query, Audio, args)
+    if args.get("artist"):
+        query = query.filter(unicode_lower(Audio.artist) == args["artist"].strip().lower())
+    if args.get("genre"):
+        query = query.filter(unicode_lower(Audio.genre) == args["genre"].strip().lower())
+    page = _page(query, Audio, fields, decode_cursor(args.get("cursor")), parse_limit(args.get("limit")))
+    if "waveform" in fields:
+        # В БД пики лежат JSON-строкой — клиенту отдаём списком
+        for item in page["items"]:
+            item["waveform"] = json.loads(item["waveform"]) if item["waveform"] else None
+    return page
+
+
+def list_videos(args):
+    fields = parse_fields(args.get("fields"), VIDEO_FIELDS)
+    query = _media_filters(Video.query, Video, args)
+    return _page(query, Video, fields, decode_cursor(args.get("cursor")), parse_limit(args.get("limit")))
+
+
+def list_categories(args):
+    fields = parse_fields(args.get("fields"), CATEGORY_FIELDS)
+    base = tuple(f for f in fields if f in ("id", "name"))
+    page = _page(CountryCategory.query, CountryCategory, base,
+                 decode_cursor(args.get("cursor")), parse_limit(args.get("limit")))
+
+    # Количество треков — по одному агрегирующему запросу на тип
+    ids = [item["id"] for item in page["items"]]
+    for field, model in (("audio_count", Audio), ("video_count", Video)):
+        if field not in fields:
+            continue
+        counts = dict(
+            model.query.with_entities(model.category_id, func.count(model.id))
+            .filter(model.category_id.in_(ids)).group_by(model.category_id)
+        ) if ids else {}
+        for item in page["items"]:
+            item[field] = counts.get(item["id"], 0)
+    return page
+
+
+def list_admin_media(media_type, args):
+    """
+    Страница списка медиа для админки: фильтры по категории (или "none" —
+    без категории), артисту и подстроке имени, сортировка с keyset-курсором
+    :return: {"items": [...], "next_cursor": str или None}
+    """
+    if media_type not in ADMIN_MEDIA:
+        raise ApiError("Неверный тип медиа")
+    model, fields = ADMIN_MEDIA[media_type]
+
+    sort_name = args.get("sort") or "id"
+    sort = ADMIN_SORTS[media_type].get(sort_name)
+    if sort is None:
+        raise ApiError("Неверная сортировка")
+    descending = args.get("order") == "desc"
+
+    query = _media_filters(model.query, model, args)
+    if media_type == "audio" and args.get("artist"):
+        query = query.filter(unicode_lower(Audio.artist) == args["artist"].strip().lower())
+    if args.get("q"):
+        pattern = "%" + args["q"].strip().lower().replace("\\", "\\\\") \
+            .replace("%", "\\%").replace("_", "\\_") + "%"
+        text_column = Audio.artist if model is Audio else Video.title
+        query = query.filter(or_(
+            unicode_lower(model.filename).like(pattern, escape="\\"),
+            unicode_lower(text_column).like(pattern, escape="\\"),
+        ))
+
+    after = decode_sort_cursor(args.get("cursor"))
+    if after is not None:
+        value, last_id = after
+        if sort_name == "id":
+            query = query.filter(model.id < last_id if descending else model.id > last_id)
+        elif descending:
+            query = query.filter(or_(sort < value, and_(sort == value, model.id < last_id)))
+        else:
+            query = query.filter(or_(sort > value, and_(sort == value, model.id > last_id)))
+
+    limit = parse_limit(args.get("limit"))
+    order = (sort.desc(), model.id.desc()) if descending else (sort.asc(), model.id.asc())
+    # Название категории — тем же запросом, без отдельной выборки всех категорий
+    rows = query.outerjoin(CountryCategory, model.category_id == CountryCategory.id) \
+        .with_entities(*[getattr(model, f) for f in fields],
+                       CountryCategory.name.label("category_name"), sort.label("sort_value")) \
+        .order_by(*order).limit(limit + 1).all()
+
+    items = []
+    for row in rows[:limit]:
+        item = {f: getattr(row, f) for f in fields}
+        item["category_name"] = row.category_name
+        items.append(item)
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_sort_cursor(last.sort_value, last.id)
+    return {"items": items, "next_cursor": next_cursor}
+
+
+# ==== Сжатие ответа ====
+def encode_json(payload, accept_encoding):
+    """
+    :return: (тело в байтах, Content-Encoding или None)
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+
+    accept_encoding = (accept_encoding or "").lower()
+    if brotli is not None and "br" in accept_encoding:
+        return brotli.compress(body, quality=5), "br"
+    if "gzip" in accept_encoding:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
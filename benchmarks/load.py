@@ -0,0 +1,401 @@
+"""
+Нагрузочный бенчмарк: витрина, /stream, fake-buy/download и загрузка в админке
+против заглушки S3 в памяти (s3_mock.py) и синтетического каталога.
+
+Каждый размер каталога гоняется в отдельном процессе (своя БД SQLite,
+свои кэши), приложение поднимается на локальном HTTP-сервере, маршруты
+по очереди нагружаются конкурентными клиентами.
+
+    python benchmarks/load.py                               # 10, 1k, 50k треков
+    python benchmarks/load.py --tracks 1000 --requests 500 --concurrency 32
+    python benchmarks/load.py --out benchmarks/baseline.json
+    python benchmarks/load.py --compare benchmarks/baseline.json --tolerance 0.25
+
+На каждый маршрут: p50/p95/p99 задержки, пропускная способность, пиковый
+RSS процесса и число SQL-запросов на запрос. --compare завершается с
+кодом 1, если p95 или число запросов выросли больше допуска.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==== Настройки ====
+DEFAULT_TRACKS = (10, 1000, 50000)
+DEFAULT_REQUESTS = 200
+DEFAULT_CONCURRENCY = 16
+OBJECT_SIZE = 256 * 1024
+RSS_SAMPLE_SECONDS = 0.02
+GENRES = ("Pop", "Rock", "Jazz", "Folk", "Electronic", "Hip-Hop", "Classical")
+
+
+# ==== Статистика ====
+def percentile(sorted_values, p):
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class RssSampler:
+    """Пиковый RSS процесса за время прогона маршрута"""
+
+    def __init__(self):
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+
+
+class QueryCounter:
+    """Число SQL-запросов через событие движка SQLAlchemy"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+
+# ==== Приложение на заглушке S3 ====
+def build_app(workdir, tracks, object_size):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["SPACES_SYNC_INTERVAL"] = "0"
+    os.environ["MEDIA_CACHE_DIR"] = os.path.join(workdir, "media_cache")
+    for name, value in (("SPACES_KEY", "bench"), ("SPACES_SECRET", "bench"),
+                        ("SPACES_BUCKET", "bench"), ("SPACES_ENDPOINT", "https://mock-s3.local")):
+        os.environ.setdefault(name, value)
+    sys.path.insert(0, ROOT)
+    os.chdir(workdir)
+
+    from flask_migrate import Migrate, upgrade
+
+    import main
+    import spaces_service
+    from s3_mock import MockS3
+
+    s3 = MockS3(object_size=object_size)
+    spaces_service.get_client = lambda: s3
+
+    app = main.create_app()
+    Migrate(app, main.db)
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        seed_catalogue(tracks, s3)
+        queries = QueryCounter(main.db.engine)
+    return app, s3, queries
+
+
+def seed_catalogue(tracks, s3):
+    """Треки и видео (1 на 10 треков) поровну по списку стран витрины"""
+    from config import db
+    from models import Audio, Video, CountryCategory
+    from spaces_service import build_public_url
+    from views import COUNTRY_CODES
+
+    db.session.bulk_insert_mappings(CountryCategory, [{"name": name} for name in COUNTRY_CODES])
+    db.session.commit()
+    category_ids = [c.id for c in CountryCategory.query.order_by(CountryCategory.id)]
+
+    rng = random.Random(tracks)
+    audios = [{
+        "filename": f"track-{i:06d}.mp3",
+        "original_name": f"Track {i}",
+        "url": build_public_url(f"track-{i:06d}.mp3"),
+        "artist": f"Artist {i % 500}",
+        "genre": rng.choice(GENRES),
+        "price": rng.randrange(99, 999),
+        "category_id": category_ids[i % len(category_ids)],
+    } for i in range(tracks)]
+    videos = [{
+        "filename": f"video-{i:06d}.mp4",
+        "original_name": f"Video {i}",
+        "url": build_public_url(f"video-{i:06d}.mp4"),
+        "title": f"Video {i}",
+        "category_id": category_ids[i % len(category_ids)],
+    } for i in range(max(1, tracks // 10))]
+
+    for i in range(0, len(audios), 5000):
+        db.session.bulk_insert_mappings(Audio, audios[i:i + 5000])
+    db.session.bulk_insert_mappings(Video, videos)
+    db.session.commit()
+    s3.seed(a["filename"] for a in audios)
+    s3.seed(v["filename"] for v in videos)
+
+
+def serve(app):
+    from werkzeug.serving import make_server
+
+    # Журнал каждого запроса искажает задержки и засоряет вывод
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ==== Клиент ====
+class Client:
+    def __init__(self, port, cookie=None):
+        self.port = port
+        self.cookie = cookie
+
+    def request(self, method, path, body=None, headers=None, keep_body=False):
+        """:return: (статус, заголовки, тело если keep_body, иначе его длина)"""
+        headers = dict(headers or {})
+        if self.cookie:
+            headers["Cookie"] = self.cookie
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            if keep_body:
+                return response.status, dict(response.getheaders()), response.read()
+            length = 0
+            while True:
+                chunk = response.read(64 * 1024)
+                if not chunk:
+                    break
+                length += len(chunk)
+            return response.status, dict(response.getheaders()), length
+        finally:
+            conn.close()
+
+    def login(self):
+        form = "username={}&password={}".format(
+            os.getenv("ADMIN_USER", "admin"), os.getenv("ADMIN_PASS", "neSko567___2341")
+        )
+        _, headers, _ = self.request(
+            "POST", "/admin/login", form, {"Content-Type": "application/x-www-form-urlencoded"}
+        )
+        self.cookie = headers["Set-Cookie"].split(";", 1)[0]
+
+
+def multipart_form(fields, file_field, filename, data):
+    boundary = "bench" + os.urandom(8).hex()
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+        f'Content-Type: audio/mpeg\r\n\r\n'.encode() + data + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+# ==== Прогон маршрута ====
+def run_route(client, queries, make_request, requests, concurrency, ok=(200,), on_body=None):
+    """
+    :param make_request: функция (номер) -> (метод, путь, тело, заголовки)
+    :param on_body: получает тело успешного ответа (иначе тело только вычитывается)
+    :return: сводка по маршруту
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        method, path, body, headers = make_request(i)
+        started = time.perf_counter()
+        try:
+            status, _, content = client.request(method, path, body, headers, keep_body=on_body is not None)
+        except OSError:
+            status = content = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if status not in ok:
+                errors += 1
+            elif on_body:
+                on_body(content)
+
+    queries_before = queries.count
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "throughput_rps": round(requests / wall, 1),
+        "peak_rss_mb": round(rss.peak, 1),
+        "queries_per_request": round((queries.count - queries_before) / requests, 2),
+    }
+
+
+def run_size(tracks, requests, concurrency, object_size):
+    """Все маршруты для одного размера каталога (вызывается в отдельном процессе)"""
+    workdir = tempfile.mkdtemp(prefix=f"nesko_bench_{tracks}_")
+    app, s3, queries = build_app(workdir, tracks, object_size)
+    server = serve(app)
+    client = Client(server.server_port)
+    rng = random.Random(42)
+
+    def track(_):
+        return f"track-{rng.randrange(tracks):06d}.mp3"
+
+    results = {}
+
+    def route(name, make_request, ok=(200,), count=requests, on_body=None):
+        results[name] = run_route(client, queries, make_request, count, concurrency, ok, on_body)
+        print(f"  [{tracks}] {name}: p50 {results[name]['p50_ms']} мс, "
+              f"p95 {results[name]['p95_ms']} мс, {results[name]['throughput_rps']} rps, "
+              f"{results[name]['queries_per_request']} SQL/запрос", file=sys.stderr)
+
+    route("index", lambda i: ("GET", "/", None, None))
+    route("index_search", lambda i: ("GET", f"/?q=artist+{i % 500}", None, None))
+    route("stream_full", lambda i: ("GET", f"/stream/{track(i)}", None, None))
+    route("stream_range", lambda i: (
+        "GET", f"/stream/{track(i)}", None, {"Range": "bytes=65536-131071"}
+    ), ok=(206,))
+
+    # fake-buy выдаёт одноразовые токены, download их гасит
+    tokens = []
+    route("fake_buy", lambda i: ("POST", f"/fake-buy/{track(i)}", None, None),
+          on_body=lambda body: tokens.append(json.loads(body)["download_url"]))
+    route("download", lambda i: ("GET", tokens[i], None, None), ok=(302,), count=len(tokens))
+
+    # Загрузка через сервер — последней: каждая сбрасывает кэш витрины
+    client.login()
+    payload = os.urandom(min(object_size, 1024 * 1024))
+
+    def upload(i):
+        body, content_type = multipart_form(
+            {"media_type": "audio", "artist": "Bench", "genre": "Pop", "price": "1.99"},
+            "file", f"upload-{i:06d}.mp3", payload
+        )
+        return "POST", "/admin", body, {"Content-Type": content_type}
+
+    route("admin_upload", upload, ok=(302,), count=max(1, requests // 4))
+
+    server.shutdown()
+    return {"tracks": tracks, "videos": max(1, tracks // 10), "routes": results, "s3_calls": s3.calls}
+
+
+# ==== Сравнение с базовой линией ====
+def compare(baseline, current, tolerance):
+    """:return: список регрессий (строки)"""
+    regressions = []
+    for size, data in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        for name, stats in data["routes"].items():
+            old = base["routes"].get(name)
+            if not old:
+                continue
+            for metric in ("p95_ms", "queries_per_request"):
+                if old[metric] and stats[metric] > old[metric] * (1 + tolerance):
+                    regressions.append(f"{size} треков, {name}: {metric} {old[metric]} -> {stats[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк маршрутов")
+    parser.add_argument("--tracks", default=",".join(map(str, DEFAULT_TRACKS)),
+                        help="размеры каталога через запятую")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--object-size", type=int, default=OBJECT_SIZE)
+    parser.add_argument("--out", help="записать результат (JSON) в файл")
+    parser.add_argument("--compare", help="базовая линия для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single is not None:
+        result = run_size(args.single, args.requests, args.concurrency, args.object_size)
+        json.dump(result, sys.stdout)
+        return 0
+
+    results = {}
+    for tracks in (int(t) for t in args.tracks.split(",") if t.strip()):
+        print(f"Каталог: {tracks} треков", file=sys.stderr)
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--single", str(tracks),
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+             "--object-size", str(args.object_size)],
+            stdout=subprocess.PIPE, check=True
+        )
+        results[str(tracks)] = json.loads(proc.stdout)
+
+    report = {
+        "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "object_size": args.object_size,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"⚠ регрессия: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
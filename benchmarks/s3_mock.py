@@ -0,0 +1,131 @@
+"""
+Заглушка S3 в памяти процесса для бенчмарков: тот же интерфейс клиента
+boto3, что использует приложение, но без сети.
+
+Содержимое засеянных объектов не хранится — байты берутся срезом из
+одного общего буфера, поэтому каталог на 50k треков не занимает память.
+"""
+import io
+import threading
+from datetime import datetime
+
+
+class MockBody:
+    """Аналог botocore StreamingBody"""
+
+    def __init__(self, data):
+        self._buf = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._buf.read(-1 if amt is None else amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._buf.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        self._buf.close()
+
+
+class MockS3:
+    """
+    :param object_size: размер засеянных объектов в байтах
+    :param latency: искусственная задержка каждого вызова, секунд
+    """
+
+    def __init__(self, object_size=256 * 1024, latency=0.0):
+        self.object_size = object_size
+        self.latency = latency
+        self._pattern = bytes(range(256)) * (object_size // 256 + 1)
+        self._seeded = set()
+        self._stored = {}
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    # ==== Наполнение ====
+    def seed(self, keys):
+        self._seeded.update(keys)
+
+    def _call(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            threading.Event().wait(self.latency)
+
+    def _data(self, key):
+        with self._lock:
+            if key in self._stored:
+                return self._stored[key]
+        if key in self._seeded:
+            return memoryview(self._pattern)[:self.object_size]
+        from botocore.exceptions import ClientError
+        raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+
+    # ==== Чтение ====
+    def head_object(self, Bucket, Key):
+        self._call("HeadObject")
+        data = self._data(Key)
+        return {"ContentLength": len(data), "ETag": f'"{hash(Key) & 0xffffffff:08x}-{len(data)}"'}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self._call("GetObject")
+        data = self._data(Key)
+        if Range:
+            first, _, last = Range[len("bytes="):].partition("-")
+            data = data[int(first):int(last) + 1]
+        return {"Body": MockBody(bytes(data)), "ContentLength": len(data)}
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn=3600):
+        return f"https://mock-s3.local/{Params['Key']}?op={operation}&expires={ExpiresIn}"
+
+    def get_paginator(self, name):
+        return MockPaginator(self)
+
+    # ==== Запись ====
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None):
+        self._call("PutObject")
+        data = Fileobj.read()
+        with self._lock:
+            self._stored[Key] = data
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._call("PutObject")
+        with self._lock:
+            self._stored[Key] = bytes(Body)
+        return {"ETag": f'"{hash(Key) & 0xffffffff:08x}"'}
+
+    def delete_object(self, Bucket, Key):
+        self._call("DeleteObject")
+        with self._lock:
+            self._stored.pop(Key, None)
+        self._seeded.discard(Key)
+
+    def delete_objects(self, Bucket, Delete):
+        self._call("DeleteObjects")
+        keys = [obj["Key"] for obj in Delete["Objects"]]
+        with self._lock:
+            for key in keys:
+                self._stored.pop(key, None)
+        self._seeded.difference_update(keys)
+        return {} if Delete.get("Quiet") else {"Deleted": [{"Key": k} for k in keys]}
+
+
+class MockPaginator:
+    """list_objects_v2 по 1000 ключей на страницу"""
+
+    def __init__(self, s3):
+        self.s3 = s3
+
+    def paginate(self, Bucket, **kwargs):
+        prefix = kwargs.get("Prefix", "")
+        keys = sorted(k for k in self.s3._seeded | set(self.s3._stored) if k.startswith(prefix))
+        for i in range(0, len(keys), 1000):
+            self.s3._call("ListObjectsV2")
+            yield {"Contents": [
+                {"Key": k, "ETag": f'"{k}"', "Size": self.s3.object_size,
+                 "LastModified": datetime(2024, 1, 1)}
+                for k in keys[i:i + 1000]
+            ]}
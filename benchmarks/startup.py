@@ -0,0 +1,100 @@
+"""
+Бенчмарк холодного старта: сколько стоит `import main; main.create_app()`.
+
+Запускает интерпретатор с `-X importtime` в отдельном процессе (без кэша
+модулей текущего), разбирает отчёт и сравнивает итог с бюджетом.
+
+    python benchmarks/startup.py                 # отчёт и проверка бюджета
+    python benchmarks/startup.py --top 30 --runs 5
+    STARTUP_BUDGET_MS=600 python benchmarks/startup.py
+
+Код выхода 1, если медиана превысила бюджет — удобно для CI.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ==== Настройки ====
+# До фабрики приложения импорт main стоил ~1200 мс (boto3, alembic, load_dotenv)
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "700"))
+STARTUP_CODE = "import main; main.create_app()"
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_once():
+    """
+    :return: (общее время в мс, {модуль: (self_us, cumulative_us, глубина)})
+    """
+    env = dict(os.environ)
+    # Ключи Spaces не нужны: клиент создаётся только при первом обращении
+    env.setdefault("DATABASE_URL", "sqlite://")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us = int(match.group(1)), int(match.group(2))
+        depth = (len(match.group(3)) - 1) // 2
+        modules[match.group(4)] = (self_us, cumulative_us, depth)
+        total_us += self_us
+    return total_us / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бюджет холодного старта приложения")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_MS, help="мс")
+    parser.add_argument("--json", help="записать результат в файл")
+    args = parser.parse_args()
+
+    totals = []
+    modules = {}
+    for _ in range(args.runs):
+        total_ms, modules = measure_once()
+        totals.append(total_ms)
+    median_ms = statistics.median(totals)
+
+    # Самые дорогие прямые импорты main/views — то, что стоит откладывать
+    top = sorted(
+        ((name, m[1] / 1000) for name, m in modules.items() if m[2] <= 1),
+        key=lambda item: item[1], reverse=True
+    )[:args.top]
+
+    print(f"Холодный старт: медиана {median_ms:.1f} мс "
+          f"(прогоны: {', '.join(f'{t:.1f}' for t in totals)}), бюджет {args.budget:.0f} мс")
+    for name, ms in top:
+        print(f"  {ms:8.1f} мс  {name}")
+    for heavy in ("boto3", "botocore", "alembic", "flask_migrate"):
+        if heavy in modules:
+            print(f"  ⚠ при старте импортирован {heavy}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "median_ms": round(median_ms, 1),
+                "runs_ms": [round(t, 1) for t in totals],
+                "budget_ms": args.budget,
+                "top": [{"module": n, "cumulative_ms": round(ms, 1)} for n, ms in top],
+            }, f, ensure_ascii=False, indent=2)
+
+    return 0 if median_ms <= args.budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
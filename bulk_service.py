@@ -0,0 +1,121 @@
+from config import db
+from models import Audio, Video, CountryCategory
+from spaces_service import delete_objects, chunks
+from stream_service import forget_object
+from thumbnail_service import delete_covers
+from ingest_service import delete_previews
+from hls_service import prune_packages
+from page_cache import bump_catalogue_version
+
+
+# ==== Настройки ====
+BULK_MAX_ITEMS = 5000
+
+MEDIA_MODELS = {"audio": Audio, "video": Video}
+# операция -> (колонка, для каких типов доступна)
+UPDATE_OPERATIONS = {
+    "set_category": ("category_id", ("audio", "video")),
+    "set_price": ("price", ("audio",)),
+    "set_genre": ("genre", ("audio",)),
+}
+
+
+class BulkError(ValueError):
+    """Неверный запрос массовой операции — отдаётся клиенту как 400"""
+
+
+def _parse_value(operation, value):
+    if operation == "set_category":
+        if value in (None, "", "none"):
+            return None
+        try:
+            category_id = int(value)
+        except (TypeError, ValueError):
+            raise BulkError("Неверная категория")
+        if db.session.get(CountryCategory, category_id) is None:
+            raise BulkError("Категория не найдена")
+        return category_id
+
+    if operation == "set_price":
+        # как и в update_media: цена приходит в рублях, храним в копейках
+        try:
+            price = int(float(value) * 100)
+        except (TypeError, ValueError):
+            raise BulkError("Неверная цена")
+        if price < 0:
+            raise BulkError("Цена не может быть отрицательной")
+        return price
+
+    return (value or "").strip() or None
+
+
+def run_bulk(media_type, filenames, operation, value=None):
+    """
+    Применяет операцию к списку файлов: удаление из Spaces пачками
+    DeleteObjects и одна транзакция с массовым UPDATE/DELETE в БД
+    :param media_type: "audio" или "video"
+    :param filenames: имена файлов
+    :param operation: "delete", "set_category", "set_price" или "set_genre"
+    :param value: новое значение для set_*
+    :return: [{"filename", "success", "message"}] в порядке filenames
+    """
+    model = MEDIA_MODELS.get(media_type)
+    if model is None:
+        raise BulkError("Неверный тип файла")
+    if operation != "delete":
+        if operation not in UPDATE_OPERATIONS:
+            raise BulkError("Неизвестная операция")
+        column, media_types = UPDATE_OPERATIONS[operation]
+        if media_type not in media_types:
+            raise BulkError("Операция недоступна для этого типа")
+
+    filenames = list(dict.fromkeys(f for f in filenames if f))
+    if not filenames:
+        raise BulkError("Не выбраны файлы")
+    if len(filenames) > BULK_MAX_ITEMS:
+        raise BulkError(f"Не больше {BULK_MAX_ITEMS} файлов за раз")
+    if operation != "delete":
+        value = _parse_value(operation, value)
+
+    columns = [model.id, model.filename] + ([Audio.thumb_url, Audio.preview_url] if model is Audio else [])
+    found = {}
+    for chunk in chunks(filenames):
+        for row in db.session.query(*columns).filter(model.filename.in_(chunk)):
+            found[row.filename] = row
+
+    results = {f: {"filename": f, "success": False, "message": "Файл не найден в базе"} for f in filenames}
+    if not found:
+        return list(results.values())
+
+    if operation == "delete":
+        errors = delete_objects(list(found))
+        for filename, error in errors.items():
+            if filename in results:
+                results[filename]["message"] = f"Ошибка удаления из облака: {error}"
+        done = [found[f] for f in found if f not in errors]
+        for row in done:
+            forget_object(row.filename)
+        for chunk in chunks([row.id for row in done]):
+            model.query.filter(model.id.in_(chunk)).delete(synchronize_session=False)
+        message = "Удалён"
+    else:
+        done = list(found.values())
+        for chunk in chunks([row.id for row in done]):
+            model.query.filter(model.id.in_(chunk)).update(
+                {getattr(model, column): value}, synchronize_session=False
+            )
+        message = "Обновлён"
+
+    if done:
+        bump_catalogue_version()
+    db.session.commit()
+
+    for row in done:
+        results[row.filename].update(success=True, message=message)
+    # обложки, превью и HLS — только после коммита, чтобы не потерять их при откате
+    if operation == "delete" and model is Audio:
+        delete_covers(row.thumb_url for row in done)
+        delete_previews(row.preview_url for row in done)
+    elif operation == "delete":
+        prune_packages(row.filename for row in done)
+    return list(results.values())
@@ -0,0 +1,298 @@
+import threading
+
+from sqlalchemy import event, func, text
+
+from config import db
+from models import Audio, Video, CountryCategory
+from thumbnail_service import build_sources
+from hls_service import hls_url
+from page_cache import get_catalogue_version
+
+
+# ==== Колонки, которые реально использует index.html ====
+AUDIO_COLUMNS = (
+    Audio.id,
+    Audio.category_id,
+    Audio.filename,
+    Audio.original_name,
+    Audio.url,
+    Audio.artist,
+    Audio.genre,
+    Audio.price,
+    Audio.thumb_url,
+    Audio.thumb_variants,
+    Audio.duration,
+    Audio.waveform,
+    Audio.preview_url,
+)
+VIDEO_COLUMNS = (
+    Video.id,
+    Video.category_id,
+    Video.filename,
+    Video.original_name,
+    Video.url,
+    Video.title,
+    Video.hls_manifest,
+)
+
+
+# ==== Поиск в БД ====
+SEARCH_TEXT = {
+    "audios": "filename || ' ' || coalesce(artist, '') || ' ' || coalesce(genre, '')",
+    "videos": "filename || ' ' || coalesce(title, '')",
+}
+# Выражения совпадают с индексами из миграции e5a91c7b2f38_add_media_search_indexes
+SEARCH_DOCUMENTS = {table: f"lower({expr})" for table, expr in SEARCH_TEXT.items()}
+FTS_MIN_QUERY = 3  # триграммный FTS5 не ищет подстроки короче 3 символов
+# Встроенный lower() в SQLite понимает только ASCII, а названия у нас кириллицей.
+# Его не подменяем (на нём построены индексы lower(artist) — их должен понимать
+# любой клиент базы), а регистрируем отдельную функцию на движках приложения
+SQLITE_LOWER = "py_lower"
+
+_fts_tables = {}
+
+
+def _register_py_lower(dbapi_connection, connection_record):
+    dbapi_connection.create_function(
+        SQLITE_LOWER, 1, lambda value: value.lower() if isinstance(value, str) else value,
+        deterministic=True
+    )
+
+
+def init_app(app):
+    """Регистрирует py_lower на SQLite-движках приложения (основном и реплике)"""
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _register_py_lower)
+
+
+def unicode_lower(expr):
+    """
+    lower() для фильтров, понимающий кириллицу и в SQLite
+    (там индекс lower(...) при этом не используется — он только для Postgres)
+    """
+    if db.session.get_bind().dialect.name == "sqlite":
+        return getattr(func, SQLITE_LOWER)(expr)
+    return func.lower(expr)
+
+
+def _has_fts(table):
+    if table not in _fts_tables:
+        _fts_tables[table] = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": f"{table}_fts"}
+        ).first() is not None
+    return _fts_tables[table]
+
+
+def _like_pattern(query):
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def search_ids(model, query):
+    """
+    id записей, подходящих под запрос, в порядке релевантности.
+    Postgres — pg_trgm + tsvector, SQLite — FTS5, иначе LIKE.
+    :param query: строка поиска в нижнем регистре
+    """
+    table = model.__tablename__
+    document = SEARCH_DOCUMENTS[table]
+    dialect = db.session.get_bind().dialect.name
+    params = {"q": query, "pattern": _like_pattern(query)}
+
+    if dialect == "postgresql":
+        sql = (
+            f"SELECT id FROM {table} WHERE {document} LIKE :pattern ESCAPE '\\' "
+            f"ORDER BY ts_rank(to_tsvector('simple', {document}), plainto_tsquery('simple', :q)) DESC, "
+            f"similarity({document}, :q) DESC, id"
+        )
+    elif dialect == "sqlite" and len(query) >= FTS_MIN_QUERY and _has_fts(table):
+        sql = f"SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH :match ORDER BY rank"
+        params = {"match": '"' + query.replace('"', '""') + '"'}
+    else:
+        if dialect == "sqlite":
+            document = f"{SQLITE_LOWER}({SEARCH_TEXT[table]})"
+        sql = f"SELECT id FROM {table} WHERE {document} LIKE :pattern ESCAPE '\\' ORDER BY id"
+
+    return [row[0] for row in db.session.execute(text(sql), params)]
+
+
+# ==== Снимок каталога ====
+class AudioRecord:
+    __slots__ = ("id", "category_id", "filename", "original_name", "url", "artist",
+                 "genre", "price", "thumb_url", "thumb_sources", "duration", "waveform",
+                 "preview_url")
+
+    def __init__(self, row):
+        self.id = row.id
+        self.category_id = row.category_id
+        self.filename = row.filename
+        self.original_name = row.original_name
+        self.url = row.url
+        self.artist = row.artist
+        self.genre = row.genre
+        self.price = row.price
+        self.thumb_url = row.thumb_url
+        self.thumb_sources = tuple(build_sources(row.thumb_variants))
+        # Заполняются ingest: плеер рисуется без запроса к самому файлу
+        self.duration = row.duration
+        self.waveform = row.waveform  # JSON как есть — уходит в data-атрибут
+        self.preview_url = row.preview_url
+
+
+class VideoRecord:
+    __slots__ = ("id", "category_id", "filename", "original_name", "url", "title",
+                 "hls_url")
+
+    def __init__(self, row):
+        self.id = row.id
+        self.category_id = row.category_id
+        self.filename = row.filename
+        self.original_name = row.original_name
+        self.url = row.url
+        self.title = row.title
+        self.hls_url = hls_url(row.hls_manifest)
+
+
+class CategorySection:
+    """Страна с её медиа — то, что получает index.html"""
+    __slots__ = ("id", "name", "audios", "videos")
+
+    def __init__(self, cat_id, name, audios, videos):
+        self.id = cat_id
+        self.name = name
+        self.audios = audios
+        self.videos = videos
+
+
+class CatalogueSnapshot:
+    """
+    Неизменяемый снимок каталога одной версии: записи со __slots__,
+    индексы по id и по категориям.
+    Не меняется после сборки, поэтому читается из любых потоков без блокировок
+    """
+    __slots__ = ("version", "categories", "audios", "videos", "audio_by_id", "video_by_id",
+                 "audios_by_category", "videos_by_category", "sections")
+
+    def __init__(self, version, categories, audios, videos):
+        self.version = version
+        self.categories = categories  # ((id, name), ...)
+        self.audios = audios          # все записи, по id
+        self.videos = videos
+        self.audio_by_id = {record.id: record for record in audios}
+        self.video_by_id = {record.id: record for record in videos}
+        self.audios_by_category = _group(audios)
+        self.videos_by_category = _group(videos)
+        # Витрина без поиска — готовые секции, на запрос ничего не собирается
+        self.sections = tuple(
+            CategorySection(cat_id, name,
+                            self.audios_by_category.get(cat_id, ()),
+                            self.videos_by_category.get(cat_id, ()))
+            for cat_id, name in categories
+        )
+
+    def search(self, query):
+        """
+        Секции только с найденными записями, внутри страны — по релевантности.
+        Поиск идёт по индексам БД (search_ids), из БД берутся только id
+        """
+        audios = _group(self._records(self.audio_by_id, search_ids(Audio, query)))
+        videos = _group(self._records(self.video_by_id, search_ids(Video, query)))
+        return tuple(
+            CategorySection(cat_id, name, audios.get(cat_id, ()), videos.get(cat_id, ()))
+            for cat_id, name in self.categories
+        )
+
+    @staticmethod
+    def _records(by_id, ids):
+        # id, которых нет в снимке (запись новее снимка), пропускаем
+        return [by_id[row_id] for row_id in ids if row_id in by_id]
+
+
+def _group(records):
+    groups = {}
+    for record in records:
+        groups.setdefault(record.category_id, []).append(record)
+    return {cat_id: tuple(items) for cat_id, items in groups.items()}
+
+
+def build_snapshot():
+    """Читает каталог из БД. Должна вызываться внутри app_context"""
+    # Версию читаем до записей: снимок может оказаться новее метки, но не старее
+    version, _ = get_catalogue_version()
+    categories = tuple(
+        CountryCategory.query.with_entities(CountryCategory.id, CountryCategory.name)
+        .order_by(CountryCategory.id)
+    )
+    audios = tuple(AudioRecord(row) for row in
+                   Audio.query.with_entities(*AUDIO_COLUMNS).order_by(Audio.id))
+    videos = tuple(VideoRecord(row) for row in
+                   Video.query.with_entities(*VIDEO_COLUMNS).order_by(Video.id))
+    return CatalogueSnapshot(version, categories, audios, videos)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(version=None):
+    """
+    Снимок для текущей версии каталога. Пересобирается одним потоком при смене
+    версии, остальные тем временем отдают прежний; замена — присваивание ссылки.
+    Ждут сборки только запросы до появления первого снимка
+    :param version: уже прочитанная версия каталога (чтобы не читать её повторно)
+    """
+    global _snapshot
+    if version is None:
+        version, _ = get_catalogue_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version >= version:
+        return snapshot
+    if not _snapshot_lock.acquire(blocking=snapshot is None):
+        # Другой поток уже пересобирает — пока отдаём прежний
+        return snapshot
+    try:
+        if _snapshot is None or _snapshot.version < version:
+            _snapshot = build_snapshot()
+        return _snapshot
+    finally:
+        _snapshot_lock.release()
+
+
+def preload_snapshot(app):
+    """
+    Собирает снимок в мастер-процессе до форка (gunicorn --preload):
+    воркеры получают его copy-on-write, не повторяя загрузку
+    """
+    import gc
+    from sqlalchemy.exc import SQLAlchemyError
+
+    with app.app_context():
+        try:
+            get_snapshot()
+        except SQLAlchemyError as e:
+            # Например, миграции ещё не применены — соберём в воркере по запросу
+            print(f"Снимок каталога не загружен заранее: {e}")
+        # Соединения пула не должны переходить в форкнутые воркеры
+        db.engine.dispose()
+    # Объекты снимка — в постоянное поколение: сборщик мусора не будет
+    # обходить их и трогать страницы памяти, общие с воркерами
+    gc.freeze()
+
+
+# ==== Каталог для витрины ====
+def load_catalogue(query="", version=None):
+    """
+    Страны с аудио и видео из снимка каталога — без запросов к БД,
+    кроме чтения версии. При поиске из БД берутся только id найденных
+    записей, внутри страны — по релевантности
+    :param query: строка поиска в нижнем регистре
+    :return: кортеж CategorySection (id, name, audios, videos)
+    """
+    snapshot = get_snapshot(version)
+    if not query:
+        return snapshot.sections
+    return snapshot.search(query)
@@ -1,3 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from db_routing import RoutingSession
+
+# Чтения внутри replica_reads() сессия сама отправляет на реплику
+db = SQLAlchemy(session_options={"class_": RoutingSession})
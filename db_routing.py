@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from collections import Counter
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+
+# ==== Настройки ====
+# Реплика включается переменной DATABASE_REPLICA_URL (см. main.create_app)
+REPLICA_BIND = "replica"
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))  # секунд; больше — читаем с основной
+REPLICA_CHECK_INTERVAL = float(os.getenv("REPLICA_CHECK_INTERVAL", "5"))  # секунд между проверками
+
+# На основной базе pg_last_wal_receive_lsn() = NULL, и отставание выходит 0.
+# Если всё полученное уже применено — реплика догнала, даже если записей давно не было
+LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+# ==== Состояние реплики (на процесс) ====
+_state = {"checked_at": None, "healthy": False, "lag": None, "error": None}
+_state_lock = threading.Lock()
+_reads = Counter()
+_reads_lock = threading.Lock()
+
+
+def _count(target):
+    with _reads_lock:
+        _reads[target] += 1
+
+
+def replica_healthy(engine):
+    """
+    Можно ли читать с реплики: отставание не больше REPLICA_MAX_LAG.
+    Проверка — не чаще раза в REPLICA_CHECK_INTERVAL, пока она идёт,
+    остальные потоки берут прежний результат
+    """
+    checked_at = _state["checked_at"]
+    if checked_at is not None and time.monotonic() - checked_at < REPLICA_CHECK_INTERVAL:
+        return _state["healthy"]
+    if not _state_lock.acquire(blocking=False):
+        return _state["healthy"]
+    try:
+        _state["checked_at"] = time.monotonic()
+        with engine.connect() as conn:
+            lag = conn.execute(LAG_SQL).scalar() if engine.dialect.name == "postgresql" else 0
+        lag = float(lag or 0)
+        _state.update(healthy=lag <= REPLICA_MAX_LAG, lag=lag, error=None)
+    except SQLAlchemyError as e:
+        _state.update(healthy=False, lag=None, error=str(e))
+        print(f"Реплика недоступна, читаем с основной базы: {e}")
+    finally:
+        _state_lock.release()
+    return _state["healthy"]
+
+
+# ==== Сессия с разделением чтения и записи ====
+class RoutingSession(Session):
+    """
+    Внутри replica_reads() запросы на чтение идут на реплику, если она
+    настроена и не отстаёт. Flush и INSERT/UPDATE/DELETE — всегда на основную
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("read_only") and not self._flushing \
+                and not getattr(clause, "is_dml", False):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                if replica_healthy(replica):
+                    _count("replica")
+                    return replica
+                _count("primary_fallback")
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@contextmanager
+def replica_reads():
+    """Чтения в блоке можно отдать реплике (данные могут отставать на REPLICA_MAX_LAG)"""
+    from config import db
+
+    info = db.session.info
+    previous = info.get("read_only", False)
+    info["read_only"] = True
+    try:
+        yield
+    finally:
+        info["read_only"] = previous
+
+
+def read_only(view):
+    """Декоратор для маршрутов, которые только читают каталог"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with replica_reads():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+# ==== Метрики ====
+def pool_stats(engines):
+    """
+    :param engines: db.engines — {bind_key: Engine}, основная под ключом None
+    :return: {"primary": {"size", "checked_out", "checked_in", "overflow"}, "replica": {...}}
+    """
+    stats = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        # У SingletonThreadPool/StaticPool (SQLite) части счётчиков нет
+        stats[key or "primary"] = {
+            name: getattr(pool, method)() if hasattr(pool, method) else None
+            for name, method in (("size", "size"), ("checked_out", "checkedout"),
+                                 ("checked_in", "checkedin"), ("overflow", "overflow"))
+        }
+    return stats
+
+
+def replica_stats():
+    with _reads_lock:
+        reads = dict(_reads)
+    return {"healthy": _state["healthy"], "lag": _state["lag"], "error": _state["error"], "reads": reads}
@@ -0,0 +1,154 @@
+import os
+import time
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime
+
+import spaces_service
+from config import db
+from models import Video
+from page_cache import bump_catalogue_version
+
+
+# ==== Настройки ====
+HLS_PREFIX = "hls/"
+HLS_SEGMENT_SECONDS = 6
+# (высота, битрейт видео) — лесенка качеств
+HLS_RENDITIONS = ((360, "800k"), (720, "2500k"))
+HLS_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+MANIFEST_CACHE = "public, max-age=60"
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+def cache_control_for(key):
+    """Сегменты неизменяемы (путь уникален для каждой упаковки), плейлисты — коротко"""
+    return MANIFEST_CACHE if key.endswith(".m3u8") else IMMUTABLE_CACHE
+
+
+def _video_prefix(filename):
+    return f"{HLS_PREFIX}{os.path.splitext(filename)[0]}/"
+
+
+# ==== Упаковка ====
+def _ffmpeg_command(source, out_dir, with_audio):
+    n = len(HLS_RENDITIONS)
+    split = f"[0:v]split={n}" + "".join(f"[v{i}]" for i in range(n)) + ";" + ";".join(
+        f"[v{i}]scale=-2:{height}[v{i}o]" for i, (height, _) in enumerate(HLS_RENDITIONS)
+    )
+    cmd = [FFMPEG, "-v", "error", "-y", "-i", source, "-filter_complex", split]
+    for i, (_, bitrate) in enumerate(HLS_RENDITIONS):
+        cmd += ["-map", f"[v{i}o]", f"-c:v:{i}", "libx264", f"-b:v:{i}", bitrate]
+        if with_audio:
+            cmd += ["-map", "0:a:0"]
+    if with_audio:
+        cmd += ["-c:a", "aac", "-b:a", "128k"]
+    stream_map = " ".join(
+        f"v:{i},a:{i}" if with_audio else f"v:{i}" for i in range(n)
+    )
+    cmd += [
+        # Ключевой кадр ровно на границе сегмента при любой частоте кадров
+        "-preset", "veryfast", "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(out_dir, "%v", "seg_%05d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", stream_map,
+        os.path.join(out_dir, "%v", "index.m3u8"),
+    ]
+    return cmd
+
+
+def package_video(video):
+    """
+    Режет видео на HLS-рендишены и выкладывает их в Spaces
+    под hls/<имя>/<метка>/ — каждая упаковка получает новый путь
+    :return: ключ master.m3u8
+    """
+    if not FFMPEG:
+        raise RuntimeError("ffmpeg не установлен")
+
+    source = spaces_service.get_presigned_view_url(video.filename)
+    prefix = f"{_video_prefix(video.filename)}{int(time.time())}/"
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        result = subprocess.run(_ffmpeg_command(source, out_dir, True), capture_output=True)
+        if result.returncode != 0:
+            # Видео без звуковой дорожки
+            result = subprocess.run(_ffmpeg_command(source, out_dir, False), capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode(errors="replace")[-500:])
+
+        for dirpath, _, files in os.walk(out_dir):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                key = prefix + os.path.relpath(path, out_dir).replace(os.sep, "/")
+                content_type = HLS_CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+                with open(path, "rb") as f:
+                    spaces_service.get_client().upload_fileobj(
+                        f, spaces_service.SPACES_BUCKET, key,
+                        ExtraArgs={
+                            "ACL": "public-read",
+                            "ContentType": content_type,
+                            "CacheControl": cache_control_for(key),
+                        },
+                        Config=spaces_service.get_transfer_config(),
+                    )
+
+    return prefix + "master.m3u8"
+
+
+def package_pending(limit=5):
+    """
+    Упаковывает видео, для которых ещё нет HLS.
+    Должна вызываться внутри app_context.
+    :return: количество обработанных видео
+    """
+    if not FFMPEG:
+        print("HLS: ffmpeg не установлен, упаковка пропущена")
+        return 0
+
+    done = 0
+    for video in Video.query.filter(Video.hls_packaged_at.is_(None)).order_by(Video.id).limit(limit):
+        try:
+            video.hls_manifest = package_video(video)
+            bump_catalogue_version()
+        except Exception as e:
+            print(f"Ошибка HLS {video.filename}: {e}")
+        # Помечаем и неудачные, чтобы битый файл не блокировал очередь
+        video.hls_packaged_at = datetime.utcnow()
+        db.session.commit()
+        # Прошлые упаковки и остатки неудачной больше не нужны
+        prune_packages([video.filename])
+        done += 1
+    return done
+
+
+def prune_packages(filenames):
+    """
+    Удаляет из Spaces HLS-упаковки видео, на которые не ссылается ни одна
+    запись Video: старые — после переупаковки, все — после удаления видео.
+    Вызывать после коммита, внутри app_context
+    :param filenames: имена видео
+    """
+    for prefix in {_video_prefix(f) for f in filenames if f}:
+        # Упаковка другого видео с тем же именем без расширения остаётся
+        keep = [
+            manifest.rsplit("/", 1)[0] + "/" for (manifest,) in
+            db.session.query(Video.hls_manifest).filter(Video.hls_manifest.startswith(prefix, autoescape=True))
+        ]
+        errors = spaces_service.delete_prefix(prefix, keep)
+        if errors:
+            print(f"HLS: не удалось удалить {len(errors)} объектов под {prefix}")
+
+
+def hls_url(manifest):
+    """URL плейлиста на нашем /hls/ для шаблона"""
+    return "/" + manifest if manifest else None
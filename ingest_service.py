@@ -0,0 +1,320 @@
+import io
+import os
+import json
+import shutil
+import threading
+import subprocess
+import urllib.parse
+from array import array
+from datetime import datetime
+from collections import OrderedDict
+
+import spaces_service
+from config import db
+from models import Audio, Video
+from page_cache import bump_catalogue_version
+
+
+# ==== Настройки ====
+READ_BLOCK = 64 * 1024
+READ_CACHE_BLOCKS = 16
+INGEST_BATCH = int(os.getenv("INGEST_BATCH", "20"))
+PREVIEW_SECONDS = 30
+PREVIEW_PREFIX = "previews/"
+WAVEFORM_POINTS = 200
+WAVEFORM_RATE = 2000  # Гц, для 200 точек хватает с запасом
+WAVEFORM_TIMEOUT = 300  # секунд на декодирование, как у превью
+
+FFMPEG = shutil.which("ffmpeg")
+
+
+# ==== Чтение объекта Spaces диапазонами ====
+class RangedReader(io.RawIOBase):
+    """
+    Файлоподобный объект поверх Spaces: читает только те блоки,
+    которые запросил парсер (заголовки ID3/MP4), а не весь файл
+    """
+
+    def __init__(self, key, size):
+        self.name = key
+        self.size = size
+        self.pos = 0
+        self.bytes_fetched = 0
+        self._blocks = OrderedDict()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(0, offset)
+        return self.pos
+
+    def _block(self, index):
+        if index in self._blocks:
+            self._blocks.move_to_end(index)
+            return self._blocks[index]
+        start = index * READ_BLOCK
+        end = min(start + READ_BLOCK, self.size) - 1
+        data = spaces_service.get_client().get_object(
+            Bucket=spaces_service.SPACES_BUCKET, Key=self.name, Range=f"bytes={start}-{end}"
+        )["Body"].read()
+        self.bytes_fetched += len(data)
+        self._blocks[index] = data
+        if len(self._blocks) > READ_CACHE_BLOCKS:
+            self._blocks.popitem(last=False)
+        return data
+
+    def readinto(self, buffer):
+        if self.pos >= self.size:
+            return 0
+        n = min(len(buffer), self.size - self.pos)
+        written = 0
+        while written < n:
+            index, offset = divmod(self.pos, READ_BLOCK)
+            chunk = self._block(index)[offset:offset + n - written]
+            if not chunk:
+                break
+            buffer[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            self.pos += len(chunk)
+        return written
+
+
+# ==== Метаданные ====
+def extract_metadata(key):
+    """
+    ID3/MP4-теги, длительность, битрейт и кодек по заголовкам файла
+    :return: (dict, RangedReader) или (None, None), если формат не распознан
+    """
+    import mutagen
+
+    size = spaces_service.get_client().head_object(Bucket=spaces_service.SPACES_BUCKET, Key=key)["ContentLength"]
+    reader = RangedReader(key, size)
+    media = mutagen.File(reader)
+    if media is None:
+        return None, None
+
+    info = media.info
+    meta = {
+        "duration": round(getattr(info, "length", 0) or 0, 3) or None,
+        "bitrate": getattr(info, "bitrate", None) or None,
+        "codec": (getattr(info, "codec", None) or type(media).__name__).lower()[:50],
+        "size": size,
+    }
+
+    tags = {}
+    try:
+        easy = mutagen.File(reader, easy=True)
+        if easy is not None and easy.tags:
+            tags = {k: v[0] for k, v in easy.tags.items() if v}
+    except Exception:
+        pass
+    meta["artist"] = tags.get("artist")
+    meta["title"] = tags.get("title")
+    meta["genre"] = tags.get("genre")
+    return meta, reader
+
+
+# ==== Превью и волна ====
+def _audio_offset(reader):
+    """Начало аудиоданных MP3 (после ID3v2-заголовка)"""
+    reader.seek(0)
+    header = reader.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        return 10 + size + (10 if header[5] & 0x10 else 0)
+    return 0
+
+
+def make_preview(key, meta, reader):
+    """
+    30-секундный фрагмент в Spaces: через ffmpeg, а без него для MP3 —
+    срезом кадров по битрейту (MP3-кадры самосинхронизируются)
+    :return: URL превью или None
+    """
+    preview_key = PREVIEW_PREFIX + os.path.splitext(key)[0] + ".mp3"
+
+    if FFMPEG:
+        source = spaces_service.get_presigned_view_url(key)
+        result = subprocess.run(
+            [FFMPEG, "-v", "error", "-t", str(PREVIEW_SECONDS), "-i", source,
+             "-vn", "-ac", "2", "-b:a", "128k", "-f", "mp3", "pipe:1"],
+            capture_output=True, timeout=300
+        )
+        if result.returncode != 0 or not result.stdout:
+            return None
+        data = result.stdout
+
+    elif meta["codec"] == "mp3" and meta["bitrate"]:
+        start = _audio_offset(reader)
+        end = min(meta["size"], start + meta["bitrate"] // 8 * PREVIEW_SECONDS)
+        reader.seek(start)
+        data = reader.read(end - start)
+
+    else:
+        return None
+
+    return spaces_service.upload_file(io.BytesIO(data), preview_key)
+
+
+def preview_key(preview_url):
+    """Ключ превью в Spaces по его URL"""
+    if not preview_url:
+        return None
+    key = urllib.parse.urlsplit(preview_url).path.lstrip("/")
+    return key if key.startswith(PREVIEW_PREFIX) else None
+
+
+def delete_previews(preview_urls):
+    """
+    Удаляет превью, на которые больше не ссылается ни одна запись Audio.
+    Вызывать после коммита, внутри app_context
+    """
+    preview_urls = {u for u in preview_urls if preview_key(u)}
+    if not preview_urls:
+        return
+    in_use = {
+        url for (url,) in db.session.query(Audio.preview_url)
+        .filter(Audio.preview_url.in_(preview_urls)).distinct()
+    }
+    keys = [preview_key(url) for url in preview_urls - in_use]
+    if keys:
+        errors = spaces_service.delete_objects(keys)
+        if errors:
+            print(f"Превью: не удалось удалить {len(errors)} объектов")
+
+
+def _peak(samples):
+    return max(max(samples), -min(samples))
+
+
+def make_waveform(key, meta, points=WAVEFORM_POINTS):
+    """
+    Пики громкости (0–255) по всему треку — нужен ffmpeg для декодирования.
+    ffmpeg сразу понижает частоту до WAVEFORM_RATE, пик точки считают
+    встроенные max/min по срезу array, а не цикл по отсчётам
+    :return: список из points значений или None
+    """
+    if not FFMPEG or not meta["duration"]:
+        return None
+
+    source = spaces_service.get_presigned_view_url(key)
+    total = int(meta["duration"] * WAVEFORM_RATE)
+    per_point = max(1, total // points)
+    peaks, tail = [], 0
+    buf, rest = array("h"), b""
+
+    proc = subprocess.Popen(
+        [FFMPEG, "-v", "error", "-i", source, "-vn", "-ac", "1",
+         "-ar", str(WAVEFORM_RATE), "-f", "s16le", "pipe:1"],
+        stdout=subprocess.PIPE
+    )
+    # Чтение из pipe блокирующее — зависший ffmpeg снимает таймер
+    timer = threading.Timer(WAVEFORM_TIMEOUT, proc.kill)
+    timer.start()
+    try:
+        while True:
+            chunk = proc.stdout.read(READ_BLOCK)
+            if not chunk:
+                break
+            chunk = rest + chunk
+            rest = chunk[len(chunk) - len(chunk) % 2:]
+            buf.frombytes(chunk[:len(chunk) - len(rest)])
+            while len(buf) >= per_point and len(peaks) < points - 1:
+                peaks.append(_peak(buf[:per_point]))
+                del buf[:per_point]
+            # Последняя точка забирает всё, что длиннее заявленной длительности
+            if len(peaks) == points - 1 and buf:
+                tail = max(tail, _peak(buf))
+                del buf[:]
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+        proc.wait()
+
+    if proc.returncode != 0:
+        print(f"Waveform {key}: ffmpeg завершился с кодом {proc.returncode}")
+        return None
+    if buf:
+        tail = max(tail, _peak(buf))
+    peaks.append(tail)
+    peaks += [0] * (points - len(peaks))
+
+    top = max(peaks) or 1
+    return [round(p * 255 / top) for p in peaks]
+
+
+# ==== Обработка новых записей ====
+def ingest_audio(audio):
+    meta, reader = extract_metadata(audio.filename)
+    if meta is None:
+        return
+    audio.duration = meta["duration"]
+    audio.bitrate = meta["bitrate"]
+    audio.codec = meta["codec"]
+    if meta["artist"] and audio.artist in (None, "", "Unknown"):
+        audio.artist = meta["artist"][:100]
+    if meta["genre"] and audio.genre in (None, "", "Unknown"):
+        audio.genre = meta["genre"][:100]
+    if meta["title"] and not audio.original_name:
+        audio.original_name = meta["title"][:255]
+
+    audio.preview_url = make_preview(audio.filename, meta, reader)
+    waveform = make_waveform(audio.filename, meta)
+    audio.waveform = json.dumps(waveform) if waveform else None
+    print(f"Ingest {audio.filename}: {meta['codec']}, {meta['duration']} с, "
+          f"прочитано {reader.bytes_fetched} из {meta['size']} байт")
+
+
+def ingest_video(video):
+    meta, reader = extract_metadata(video.filename)
+    if meta is None:
+        return
+    video.duration = meta["duration"]
+    video.bitrate = meta["bitrate"]
+    video.codec = meta["codec"]
+    if meta["title"] and not video.original_name:
+        video.original_name = meta["title"][:255]
+
+
+def ingest_pending(limit=INGEST_BATCH):
+    """
+    Обрабатывает записи, для которых ещё не извлекались метаданные.
+    Должна вызываться внутри app_context.
+    :return: количество обработанных записей
+    """
+    done = 0
+    for model, handler in ((Audio, ingest_audio), (Video, ingest_video)):
+        for record in model.query.filter(model.ingested_at.is_(None)).order_by(model.id).limit(limit).all():
+            record_id, filename = record.id, record.filename
+            try:
+                handler(record)
+                record.ingested_at = datetime.utcnow()
+                db.session.commit()
+            except Exception as e:
+                print(f"Ошибка ingest {filename}: {e}")
+                # Частично заполненную запись не сохраняем: откатываем и
+                # перечитываем, а помечаем уже чистую
+                db.session.rollback()
+                record = db.session.get(model, record_id)
+                if record is None:  # удалена, пока обрабатывали
+                    continue
+                # Помечаем и неудачные, чтобы не зацикливаться на битом файле
+                record.ingested_at = datetime.utcnow()
+                db.session.commit()
+            done += 1
+
+    if done:
+        bump_catalogue_version()
+        db.session.commit()
+    return done
@@ -0,0 +1,322 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import spaces_service
+from config import db
+from db_routing import REPLICA_BIND, pool_stats, replica_stats
+
+
+# ==== Настройки ====
+# Server-Timing раскрывает разбивку времени клиенту — можно выключить
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") == "1"
+# Если задан — /metrics только с заголовком Authorization: Bearer <токен>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))  # секунд между снимками
+PROFILER_MAX_SECONDS = 300
+
+
+# ==== Счётчики на запрос (flask.g) ====
+def _timing():
+    # Вне запроса (фоновая синхронизация, тело стрима после ответа) не считаем
+    return g.get("timing") if has_request_context() else None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+    if context is not None:
+        context.query_timed = True
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    if context is not None:
+        context.query_timed = False
+    timing = _timing()
+    if timing is not None:
+        timing["db_count"] += 1
+        timing["db_seconds"] += time.perf_counter() - started
+
+
+@event.listens_for(Engine, "handle_error")
+def _on_cursor_error(exception_context):
+    # after_cursor_execute для упавшего запроса не вызывается — иначе отметка
+    # осталась бы в стеке и сдвинула время всех следующих запросов соединения
+    context = exception_context.execution_context
+    if context is not None and getattr(context, "query_timed", False):
+        context.query_timed = False
+        exception_context.connection.info["query_started"].pop()
+
+
+def _on_s3_call(operation, seconds, error):
+    timing = _timing()
+    if timing is not None:
+        timing["s3_count"] += 1
+        timing["s3_seconds"] += seconds
+
+
+def _on_render_start(sender, template, context, **extra):
+    timing = _timing()
+    if timing is not None:
+        timing["render_started"] = time.perf_counter()
+
+
+def _on_rendered(sender, template, context, **extra):
+    timing = _timing()
+    if timing is not None and timing.get("render_started"):
+        timing["render_seconds"] += time.perf_counter() - timing.pop("render_started")
+
+
+# ==== Гистограммы маршрутов (на процесс) ====
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def _observe(route, method, status, timing, elapsed):
+    key = (route, method)
+    with _routes_lock:
+        r = _routes.get(key)
+        if r is None:
+            r = _routes[key] = {
+                "buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0,
+                "statuses": Counter(), "db_count": 0, "db_seconds": 0.0,
+                "s3_count": 0, "s3_seconds": 0.0,
+            }
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                r["buckets"][i] += 1
+        r["count"] += 1
+        r["sum"] += elapsed
+        r["statuses"][str(status)] += 1
+        for field in ("db_count", "db_seconds", "s3_count", "s3_seconds"):
+            r[field] += timing[field]
+
+
+def _before_request():
+    g.timing = {
+        "started": time.perf_counter(),
+        "db_count": 0, "db_seconds": 0.0,
+        "s3_count": 0, "s3_seconds": 0.0,
+        "render_seconds": 0.0,
+    }
+
+
+def _after_request(response):
+    timing = g.get("timing")
+    if timing is None:
+        return response
+    # Для потоковых ответов — время до заголовков, тело уходит позже
+    elapsed = time.perf_counter() - timing["started"]
+    route = request.endpoint or "unmatched"
+    _observe(route, request.method, response.status_code, timing, elapsed)
+
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = ", ".join((
+            f'db;dur={timing["db_seconds"] * 1000:.1f};desc="{timing["db_count"]} queries"',
+            f's3;dur={timing["s3_seconds"] * 1000:.1f};desc="{timing["s3_count"]} calls"',
+            f'render;dur={timing["render_seconds"] * 1000:.1f}',
+            f'app;dur={elapsed * 1000:.1f}',
+        ))
+    return response
+
+
+_installed = False
+
+
+def init_app(app):
+    """Подключает счётчики запросов, Server-Timing и гистограммы к приложению"""
+    global _installed
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_on_render_start, app)
+    template_rendered.connect(_on_rendered, app)
+    if not _installed:
+        spaces_service.add_call_listener(_on_s3_call)
+        _installed = True
+
+
+# ==== Экспорт в формате Prometheus ====
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def metrics_authorized(authorization):
+    return not METRICS_TOKEN or authorization == f"Bearer {METRICS_TOKEN}"
+
+
+def render_metrics():
+    """
+    Метрики этого процесса в текстовом формате Prometheus
+    (у каждого воркера gunicorn — свои)
+    """
+    with _routes_lock:
+        routes = {key: {**r, "buckets": list(r["buckets"]), "statuses": Counter(r["statuses"])}
+                  for key, r in _routes.items()}
+
+    lines = [
+        "# HELP nesko_request_duration_seconds Время обработки запроса до отправки заголовков",
+        "# TYPE nesko_request_duration_seconds histogram",
+    ]
+    for (route, method), r in sorted(routes.items()):
+        labels = f'route="{_label(route)}",method="{method}"'
+        for bound, count in zip(LATENCY_BUCKETS, r["buckets"]):
+            lines.append(f'nesko_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'nesko_request_duration_seconds_bucket{{{labels},le="+Inf"}} {r["count"]}')
+        lines.append(f'nesko_request_duration_seconds_sum{{{labels}}} {r["sum"]:.6f}')
+        lines.append(f'nesko_request_duration_seconds_count{{{labels}}} {r["count"]}')
+
+    sections = (
+        ("nesko_requests_total", "counter", "Запросы по статусу ответа", None),
+        ("nesko_db_queries_total", "counter", "SQL-запросы, выполненные при обработке маршрута", "db_count"),
+        ("nesko_db_seconds_total", "counter", "Время SQL-запросов по маршруту", "db_seconds"),
+        ("nesko_s3_calls_total", "counter", "Вызовы S3 по маршруту", "s3_count"),
+        ("nesko_s3_seconds_total", "counter", "Время вызовов S3 по маршруту", "s3_seconds"),
+    )
+    for name, kind, help_text, field in sections:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (route, method), r in sorted(routes.items()):
+            labels = f'route="{_label(route)}",method="{method}"'
+            if field is None:
+                for status, count in sorted(r["statuses"].items()):
+                    lines.append(f'{name}{{{labels},status="{status}"}} {count}')
+            else:
+                lines.append(f"{name}{{{labels}}} {r[field]:g}")
+
+    lines += [
+        "# HELP nesko_s3_operations_total Операции S3 в процессе (включая фоновые)",
+        "# TYPE nesko_s3_operations_total counter",
+    ]
+    s3 = spaces_service.get_s3_metrics()
+    for operation, m in sorted(s3.items()):
+        lines.append(f'nesko_s3_operations_total{{operation="{operation}"}} {m["count"]}')
+    lines += ["# HELP nesko_s3_errors_total Ошибки операций S3 в процессе",
+              "# TYPE nesko_s3_errors_total counter"]
+    for operation, m in sorted(s3.items()):
+        lines.append(f'nesko_s3_errors_total{{operation="{operation}"}} {m["errors"]}')
+    lines += ["# HELP nesko_s3_operation_seconds_total Время операций S3 в процессе",
+              "# TYPE nesko_s3_operation_seconds_total counter"]
+    for operation, m in sorted(s3.items()):
+        lines.append(f'nesko_s3_operation_seconds_total{{operation="{operation}"}} {m["total_seconds"]:.6f}')
+
+    # Пулы соединений по bind'ам: primary и (если настроена) replica
+    pools = pool_stats(db.engines)
+    lines += ["# HELP nesko_db_pool_connections Соединения пула по bind и состоянию",
+              "# TYPE nesko_db_pool_connections gauge"]
+    for bind, stats in sorted(pools.items()):
+        for state, value in stats.items():
+            if value is not None:
+                lines.append(f'nesko_db_pool_connections{{bind="{bind}",state="{state}"}} {value}')
+
+    replica = replica_stats()
+    lines += ["# HELP nesko_db_replica_reads_total Чтения из replica_reads(): на реплике или на основной из-за отставания",
+              "# TYPE nesko_db_replica_reads_total counter"]
+    for target, count in sorted(replica["reads"].items()):
+        lines.append(f'nesko_db_replica_reads_total{{target="{target}"}} {count}')
+    if REPLICA_BIND in pools:
+        lines += ["# HELP nesko_db_replica_healthy Реплика используется для чтения (1) или нет (0)",
+                  "# TYPE nesko_db_replica_healthy gauge",
+                  f'nesko_db_replica_healthy {int(replica["healthy"])}']
+        if replica["lag"] is not None:
+            lines += ["# HELP nesko_db_replica_lag_seconds Отставание реплики при последней проверке",
+                      "# TYPE nesko_db_replica_lag_seconds gauge",
+                      f'nesko_db_replica_lag_seconds {replica["lag"]:.3f}']
+    return "\n".join(lines) + "\n"
+
+
+# ==== Сэмплирующий профайлер ====
+class SamplingProfiler:
+    """
+    Раз в interval снимает стеки всех потоков процесса (sys._current_frames).
+    Накладные расходы не зависят от числа вызовов, поэтому его можно включать
+    на проде на короткое время
+    """
+
+    def __init__(self, interval=PROFILER_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._reset()
+
+    def _reset(self):
+        self.stacks = Counter()
+        self.leaves = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds=30):
+        """Запускает сбор на seconds секунд (прежние снимки сбрасываются)"""
+        with self._lock:
+            if self.running:
+                return False
+            self._reset()
+            self._stop.clear()
+            self.started_at = time.time()
+            self._thread = threading.Thread(
+                target=self._run, args=(min(seconds, PROFILER_MAX_SECONDS),),
+                name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, seconds):
+        deadline = time.monotonic() + seconds
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                with self._lock:
+                    self.stacks[";".join(reversed(stack))] += 1
+                    self.leaves[stack[0]] += 1
+                    self.samples += 1
+        self.stopped_at = time.time()
+
+    def report(self, limit=30):
+        with self._lock:
+            total = self.samples or 1
+            return {
+                "running": self.running,
+                "samples": self.samples,
+                "interval": self.interval,
+                "started_at": self.started_at,
+                "stopped_at": self.stopped_at,
+                "top": [
+                    {"frame": frame, "samples": count, "percent": round(count * 100 / total, 1)}
+                    for frame, count in self.leaves.most_common(limit)
+                ],
+            }
+
+    def collapsed(self):
+        """Стеки в формате flamegraph.pl / speedscope: «a;b;c количество»"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,225 @@
+"""
+ASGI-режим: /stream, /hls и /download обслуживаются асинхронно, всё
+остальное (витрина, API, админка) — тем же Flask-приложением через WsgiToAsgi.
+
+Медленный слушатель не держит воркер: тело идёт кусками, следующий кусок
+читается только после того, как сервер принял предыдущий (await send).
+
+    uvicorn "main:create_asgi_app" --factory --host 0.0.0.0 --port $PORT
+    gunicorn -k uvicorn.workers.UvicornWorker "main:create_asgi_app()"
+"""
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+
+import spaces_service
+from stream_service import (
+    STREAM_CHUNK_SIZE, plan_stream_response, stream_redirect_url,
+    iter_object, ObjectNotFound, RangeNotSatisfiable
+)
+from media_cache import block_cache
+from hls_service import HLS_PREFIX, cache_control_for
+
+
+class MediaASGI:
+    """
+    Маршрутизатор ASGI: медиа-маршруты — сами, остальное — во Flask
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = (
+            ("/stream/", self.stream),
+            ("/hls/", self.hls),
+            ("/download/", self.download),
+        )
+        self._s3 = None
+        self._s3_context = None
+        self._s3_lock = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+
+        if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+            path = scope["path"]
+            for prefix, handler in self.routes:
+                if path.startswith(prefix) and len(path) > len(prefix):
+                    return await handler(scope, receive, send, path[len(prefix):])
+
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._s3 is not None:
+                    await self._s3_context.__aexit__(None, None, None)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ==== Асинхронный клиент S3 (один на цикл событий) ====
+    async def get_s3(self):
+        """:return: клиент aiobotocore или None, если он не установлен"""
+        if self._s3_lock is None:
+            self._s3_lock = asyncio.Lock()
+        async with self._s3_lock:
+            if self._s3_context is None:
+                self._s3_context = spaces_service.create_async_client() or False
+                if self._s3_context:
+                    self._s3 = await self._s3_context.__aenter__()
+                    spaces_service.register_metrics(self._s3)
+        return self._s3
+
+    # ==== Маршруты ====
+    async def stream(self, scope, receive, send, key, cache_control=None):
+        range_header = _header(scope, b"range")
+        try:
+            redirect_url, planned = await asyncio.to_thread(
+                self._prepare, key, range_header, _header(scope, b"if-range")
+            )
+        except ObjectNotFound:
+            return await _respond(send, 404, {"Content-Type": "text/plain; charset=utf-8"}, b"Not Found")
+        except RangeNotSatisfiable as e:
+            return await _respond(send, 416, e.args[0])
+
+        if redirect_url:
+            return await _respond(send, 302, {"Location": redirect_url})
+
+        meta, plan, status, headers = planned
+        if cache_control:
+            headers["Cache-Control"] = cache_control
+        await send({"type": "http.response.start", "status": status, "headers": _encode(headers)})
+        if scope["method"] == "HEAD":
+            return await send({"type": "http.response.body", "body": b""})
+
+        await self._send_body(receive, send, self._iter_plan(key, meta, plan))
+
+    async def hls(self, scope, receive, send, key):
+        key = HLS_PREFIX + key
+        # Сегменты лежат по уникальному пути упаковки — кэшируются навсегда
+        await self.stream(scope, receive, send, key, cache_control_for(key))
+
+    async def download(self, scope, receive, send, token):
+        from views import resolve_download
+
+        def resolve():
+            # Токены и БД — синхронные, в потоке с контекстом приложения
+            with self.flask_app.app_context():
+                return resolve_download(token)
+
+        presigned_url, error = await asyncio.to_thread(resolve)
+        if error:
+            text, status = error
+            return await _respond(send, status, {"Content-Type": "text/plain; charset=utf-8"}, text.encode())
+        await _respond(send, 302, {"Location": presigned_url})
+
+    # ==== Тело ответа ====
+    @staticmethod
+    def _prepare(key, range_header, if_range=None):
+        """Редирект или план ответа — в потоке: head_object и подпись URL синхронные"""
+        redirect_url = stream_redirect_url(key)
+        if redirect_url:
+            return redirect_url, None
+        return None, plan_stream_response(key, range_header, if_range)
+
+    async def _iter_plan(self, key, meta, plan):
+        for part in plan:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            start, end = part
+            s3 = await self.get_s3()
+            if not s3:
+                # Без aiobotocore: блочный кэш и boto3 — по куску в пуле потоков
+                chunks = _aiter_in_thread(iter_object(key, start, end, meta))
+            elif meta["etag"] and block_cache.enabled:
+                if meta["size"] == 0:
+                    continue
+                if start is None:
+                    start, end = 0, meta["size"] - 1
+                # Промахи кэша — через aiobotocore, без потока на каждый кусок
+                chunks = block_cache.aiter_range(
+                    key, meta["etag"], start, end, meta["size"],
+                    lambda first, last: _aiter_origin(s3, key, first, last)
+                )
+            else:
+                chunks = _aiter_origin(s3, key, start, end)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+
+    async def _send_body(self, receive, send, chunks):
+        disconnected = asyncio.Event()
+
+        async def watch():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch())
+        try:
+            async for chunk in chunks:
+                # Слушатель ушёл — дальше из Spaces не читаем
+                if disconnected.is_set():
+                    return
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            await chunks.aclose()
+
+
+# ==== Помощники ====
+async def _aiter_origin(s3, key, start=None, end=None):
+    """Тело объекта через aiobotocore кусками по STREAM_CHUNK_SIZE"""
+    params = {"Bucket": spaces_service.SPACES_BUCKET, "Key": key}
+    if start is not None:
+        params["Range"] = f"bytes={start}-{end}"
+    body = (await s3.get_object(**params))["Body"]
+    try:
+        while True:
+            chunk = await body.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+async def _aiter_in_thread(iterator):
+    done = object()
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, iterator, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        # Закрытие генератора закрывает и тело ответа boto3
+        await asyncio.to_thread(iterator.close)
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _encode(headers):
+    headers = dict(headers)
+    headers.setdefault("Access-Control-Allow-Origin", "*")
+    return [(k.lower().encode("latin-1"), str(v).encode("latin-1")) for k, v in headers.items()]
+
+
+async def _respond(send, status, headers, body=b""):
+    headers = dict(headers)
+    headers["Content-Length"] = str(len(body))
+    await send({"type": "http.response.start", "status": status, "headers": _encode(headers)})
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,362 @@
+import os
+import asyncio
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировок между процессами нет
+    fcntl = None
+
+
+# ==== Настройки ====
+CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "nesko_media_cache"))
+# Лимит размера кэша в байтах (0 — кэш выключен)
+CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(1024 ** 3)))
+BLOCK_SIZE = int(os.getenv("MEDIA_CACHE_BLOCK_SIZE", str(1024 * 1024)))
+READ_CHUNK = 64 * 1024
+# Вытеснение освобождает место с запасом, чтобы не сканировать каталог на каждой записи
+EVICT_TO = 0.9
+
+LOCK_FILE = ".lock"
+USAGE_FILE = ".usage"
+TMP_PREFIX = ".tmp"
+
+
+class BlockSlice:
+    """
+    Диапазон [lo, hi) файла блока для wsgi.file_wrapper: gunicorn отдаёт его
+    через sendfile с текущей позиции (Content-Length ограничивает длину),
+    остальные серверы читают через read(), который не выходит за hi
+    """
+
+    def __init__(self, f, lo, hi):
+        self._f = f
+        self._left = hi - lo
+        f.seek(lo)
+
+    def fileno(self):
+        return self._f.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self._f.read(size) if size else b""
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+class BlockCache:
+    """
+    Блочный кэш байтовых диапазонов на локальном диске.
+    Блок — файл с ключом (key, ETag, номер блока); вытеснение LRU по лимиту размера.
+    Каталог общий для всех воркеров: занятый объём лежит в файле .usage и
+    меняется под блокировкой .lock, время доступа — mtime файла блока.
+    Блок, который кто-то отдаёт, держит разделяемую блокировку и не вытесняется.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, block_size=BLOCK_SIZE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.block_size = block_size
+        self._lock = threading.Lock()  # счётчики stats
+        self._usage_lock = threading.Lock()  # потоки процесса; между процессами — flock
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "bytes_from_cache": 0,
+            "bytes_from_origin": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, value in deltas.items():
+                self.stats[name] += value
+
+    def block_path(self, key, etag, index):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}-{etag}-{index}")
+
+    # ---- Общий учёт объёма ----
+    @contextmanager
+    def _shared(self):
+        """Эксклюзивный доступ к .usage для всех процессов, работающих с каталогом"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._usage_lock, open(os.path.join(self.root, LOCK_FILE), "a+b") as lock:
+            if fcntl:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _read_usage(self):
+        try:
+            with open(os.path.join(self.root, USAGE_FILE)) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return None
+
+    def _write_usage(self, total):
+        with open(os.path.join(self.root, USAGE_FILE), "w") as f:
+            f.write(str(max(total, 0)))
+
+    def _scan(self):
+        """:return: [(mtime, path, size)] всех блоков каталога"""
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+        return found
+
+    def _evict(self, keep):
+        """
+        Удаляет самые давние блоки, пока объём не опустится до EVICT_TO лимита.
+        Объём пересчитывается сканированием — заодно исправляется .usage,
+        если процесс упал между записью блока и обновлением счётчика
+        :param keep: только что записанный блок
+        :return: (новый объём, сколько удалено)
+        """
+        found = self._scan()
+        total = sum(size for _, _, size in found)
+        target = int(self.max_bytes * EVICT_TO)
+        evicted = 0
+        for _, path, size in sorted(found):
+            if total <= target:
+                break
+            if path != keep and self._remove_unused(path):
+                total -= size
+                evicted += 1
+        return total, evicted
+
+    @staticmethod
+    def _remove_unused(path):
+        """Удаляет блок, если его сейчас никто не отдаёт"""
+        try:
+            f = open(path, "rb", buffering=0)
+        except FileNotFoundError:
+            return True
+        with f:
+            if fcntl:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+    def _store(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TMP_PREFIX)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        evicted = 0
+        with self._shared():
+            try:
+                old = os.stat(path).st_size
+            except FileNotFoundError:
+                old = 0
+            os.replace(tmp, path)
+            total = self._read_usage()
+            if total is None:
+                total = sum(size for _, _, size in self._scan())
+            else:
+                total += len(data) - old
+            if total > self.max_bytes:
+                total, evicted = self._evict(keep=path)
+            self._write_usage(total)
+        if evicted:
+            self._count(evictions=evicted)
+
+    # ---- Чтение ----
+    def _open_block(self, path, hi):
+        """
+        Открывает блок под разделяемой блокировкой (её снимает закрытие файла)
+        :return: файл или None, если блока нет или он короче hi
+        """
+        try:
+            f = open(path, "rb", buffering=0)
+        except FileNotFoundError:
+            return None
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        if os.fstat(f.fileno()).st_size < hi:
+            f.close()
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    def open_range(self, key, etag, start, end):
+        """
+        Байты [start, end] объекта, если они целиком в одном блоке кэша
+        :return: BlockSlice или None
+        """
+        bs = self.block_size
+        index = start // bs
+        if end // bs != index:
+            return None
+        lo, hi = start - index * bs, end + 1 - index * bs
+        f = self._open_block(self.block_path(key, etag, index), hi)
+        if f is None:
+            return None
+        self._count(hits=1, bytes_from_cache=hi - lo)
+        return BlockSlice(f, lo, hi)
+
+    def _next_span(self, key, etag, index, last, start, end, size):
+        """
+        Что делать с блоком index: ("hit", файл, lo, hi) — отдать из кэша,
+        ("miss", первый, последний) — забрать из Spaces серию отсутствующих блоков
+        """
+        bs = self.block_size
+        block_start = index * bs
+        lo = max(start, block_start) - block_start
+        hi = min(end + 1, block_start + bs, size) - block_start
+
+        f = self._open_block(self.block_path(key, etag, index), hi)
+        if f is not None:
+            self._count(hits=1, bytes_from_cache=hi - lo)
+            return "hit", f, lo, hi
+
+        run_end = index
+        while run_end < last and not os.path.exists(self.block_path(key, etag, run_end + 1)):
+            run_end += 1
+        self._count(misses=run_end - index + 1)
+        return "miss", index, run_end
+
+    def iter_range(self, key, etag, start, end, size, fetch):
+        """
+        Отдаёт байты [start, end] объекта: из кэша, а недостающие блоки —
+        одним запросом fetch(first_byte, last_byte) на каждую подряд идущую серию
+        """
+        index, last = start // self.block_size, end // self.block_size
+        while index <= last:
+            span = self._next_span(key, etag, index, last, start, end, size)
+            if span[0] == "hit":
+                _, f, lo, hi = span
+                with f:
+                    block = BlockSlice(f, lo, hi)
+                    while True:
+                        chunk = block.read(READ_CHUNK)
+                        if not chunk:
+                            break
+                        yield chunk
+                index += 1
+                continue
+
+            # Серия отсутствующих блоков забирается из Spaces одним запросом
+            _, first, run_end = span
+            run = _BlockRun(self, key, etag, first, run_end, start, end, size)
+            for chunk in fetch(*run.byte_range):
+                for piece, path, data in run.feed(chunk):
+                    if piece:
+                        yield piece
+                    self._store(path, data)
+            index = run_end + 1
+
+    async def aiter_range(self, key, etag, start, end, size, afetch):
+        """
+        То же для ASGI: промахи читает асинхронный fetch (aiobotocore),
+        диск — в пуле потоков, чтобы не держать цикл событий
+        """
+        index, last = start // self.block_size, end // self.block_size
+        while index <= last:
+            span = await asyncio.to_thread(self._next_span, key, etag, index, last, start, end, size)
+            if span[0] == "hit":
+                _, f, lo, hi = span
+                try:
+                    block = BlockSlice(f, lo, hi)
+                    while True:
+                        chunk = await asyncio.to_thread(block.read, READ_CHUNK)
+                        if not chunk:
+                            break
+                        yield chunk
+                finally:
+                    f.close()
+                index += 1
+                continue
+
+            _, first, run_end = span
+            run = _BlockRun(self, key, etag, first, run_end, start, end, size)
+            chunks = afetch(*run.byte_range)
+            try:
+                async for chunk in chunks:
+                    for piece, path, data in run.feed(chunk):
+                        if piece:
+                            yield piece
+                        await asyncio.to_thread(self._store, path, data)
+            finally:
+                await chunks.aclose()
+            index = run_end + 1
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        found = self._scan() if os.path.isdir(self.root) else []
+        stats.update({
+            "blocks": len(found),
+            "bytes": sum(size for _, _, size in found),
+            "max_bytes": self.max_bytes,
+            "block_size": self.block_size,
+        })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else None
+        return stats
+
+
+class _BlockRun:
+    """Режет поток байтов серии блоков из Spaces на блоки для записи в кэш"""
+
+    def __init__(self, cache, key, etag, first, last, start, end, size):
+        self.cache, self.key, self.etag = cache, key, etag
+        self.current, self.last = first, last
+        self.start, self.end, self.size = start, end, size
+        self.buf = bytearray()
+        bs = cache.block_size
+        self.byte_range = (first * bs, min((last + 1) * bs, size) - 1)
+
+    def _block_len(self, index):
+        bs = self.cache.block_size
+        return min(bs, self.size - index * bs)
+
+    def feed(self, chunk):
+        """
+        :return: [(кусок для ответа, путь блока, байты блока)] для собранных блоков
+        """
+        self.cache._count(bytes_from_origin=len(chunk))
+        self.buf += chunk
+        done = []
+        while self.current <= self.last and len(self.buf) >= self._block_len(self.current):
+            block_len = self._block_len(self.current)
+            data = bytes(self.buf[:block_len])
+            del self.buf[:block_len]
+            block_start = self.current * self.cache.block_size
+            lo = max(self.start, block_start) - block_start
+            hi = min(self.end + 1, block_start + block_len) - block_start
+            done.append((data[lo:hi] if hi > lo else b"",
+                         self.cache.block_path(self.key, self.etag, self.current), data))
+            self.current += 1
+        return done
+
+
+block_cache = BlockCache()
@@ -0,0 +1,47 @@
+"""Add lookup indexes for audios and videos
+
+Revision ID: c7e2f9a41d05
+Revises: b93f5d2e8a46
+Create Date: 2026-10-18 17:02:37.915204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e2f9a41d05'
+down_revision = 'b93f5d2e8a46'
+branch_labels = None
+depends_on = None
+
+
+# Выражения должны совпадать с фильтрами api_service (func.lower(...) == ...)
+LOWER_INDEXES = {
+    'ix_audios_artist_lower': ('audios', 'artist'),
+    'ix_audios_genre_lower': ('audios', 'genre'),
+}
+
+
+def upgrade():
+    # Без batch_alter_table: на SQLite он пересоздаёт таблицу и теряет FTS-триггеры
+    for table in ('audios', 'videos'):
+        # Дубли имени файла: оставляем самую раннюю запись — её и находил .first()
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN "
+            f"(SELECT MIN(id) FROM {table} GROUP BY filename)"
+        )
+        op.create_index(op.f(f'ix_{table}_filename'), table, ['filename'], unique=True)
+        op.create_index(op.f(f'ix_{table}_category_id'), table, ['category_id'], unique=False)
+
+    for name, (table, column) in LOWER_INDEXES.items():
+        op.create_index(name, table, [sa.text(f'lower({column})')], unique=False)
+
+
+def downgrade():
+    for name, (table, _) in LOWER_INDEXES.items():
+        op.drop_index(name, table_name=table)
+
+    for table in ('videos', 'audios'):
+        op.drop_index(op.f(f'ix_{table}_category_id'), table_name=table)
+        op.drop_index(op.f(f'ix_{table}_filename'), table_name=table)
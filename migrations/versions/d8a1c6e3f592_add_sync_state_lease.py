@@ -0,0 +1,33 @@
+"""Add sync_state lease
+
+Revision ID: d8a1c6e3f592
+Revises: c7e2f9a41d05
+Create Date: 2026-10-18 19:24:51.307846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a1c6e3f592'
+down_revision = 'c7e2f9a41d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sync_state', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+    # Строка создаётся здесь, а не при первом обращении — иначе воркеры
+    # гоняются за её вставку
+    op.execute(
+        "INSERT INTO sync_state (name, objects_seen) SELECT 'spaces', 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sync_state WHERE name = 'spaces')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('sync_state', schema=None) as batch_op:
+        batch_op.drop_column('locked_until')
@@ -0,0 +1,28 @@
+"""Seed catalogue_version
+
+Revision ID: e4b7d2a9c815
+Revises: d8a1c6e3f592
+Create Date: 2026-10-18 19:51:08.442317
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7d2a9c815'
+down_revision = 'd8a1c6e3f592'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Базы, где catalogue_version создана до того, как миграция стала
+    # добавлять строку, и версию ещё ни разу не меняли
+    op.execute(
+        "INSERT INTO catalogue_version (id, version) SELECT 1, 0 "
+        "WHERE NOT EXISTS (SELECT 1 FROM catalogue_version WHERE id = 1)"
+    )
+
+
+def downgrade():
+    pass
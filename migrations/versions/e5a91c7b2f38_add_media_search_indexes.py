@@ -0,0 +1,77 @@
+"""Add full-text search indexes for audios and videos
+
+Revision ID: e5a91c7b2f38
+Revises: d3f08a6c5e21
+Create Date: 2026-10-18 12:20:51.307114
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a91c7b2f38'
+down_revision = 'd3f08a6c5e21'
+branch_labels = None
+depends_on = None
+
+
+# Выражения должны совпадать с catalogue_service.SEARCH_DOCUMENTS,
+# иначе Postgres не будет использовать индексы
+SEARCH_DOCUMENTS = {
+    'audios': "lower(filename || ' ' || coalesce(artist, '') || ' ' || coalesce(genre, ''))",
+    'videos': "lower(filename || ' ' || coalesce(title, ''))",
+}
+FTS_COLUMNS = {
+    'audios': ('filename', 'artist', 'genre'),
+    'videos': ('filename', 'title'),
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, document in SEARCH_DOCUMENTS.items():
+            op.execute(f"CREATE INDEX ix_{table}_search_trgm ON {table} USING gin (({document}) gin_trgm_ops)")
+            op.execute(f"CREATE INDEX ix_{table}_search_tsv ON {table} USING gin (to_tsvector('simple', {document}))")
+
+    elif dialect == 'sqlite':
+        # FTS5 с триграммным токенизатором: поиск подстроки как раньше в Python
+        for table, columns in FTS_COLUMNS.items():
+            cols = ', '.join(columns)
+            new_vals = ', '.join(f'new.{c}' for c in columns)
+            old_vals = ', '.join(f'old.{c}' for c in columns)
+            op.execute(
+                f"CREATE VIRTUAL TABLE {table}_fts USING fts5({cols}, "
+                f"content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {table}_fts(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END"
+            )
+            op.execute(
+                f"CREATE TRIGGER {table}_fts_au AFTER UPDATE ON {table} BEGIN "
+                f"INSERT INTO {table}_fts({table}_fts, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+                f"INSERT INTO {table}_fts(rowid, {cols}) VALUES (new.id, {new_vals}); END"
+            )
+            op.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table in SEARCH_DOCUMENTS:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_tsv")
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_trgm")
+
+    elif dialect == 'sqlite':
+        for table in FTS_COLUMNS:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {table}_fts")
@@ -0,0 +1,33 @@
+"""Widen spaces_objects.key to 1024
+
+Revision ID: f1a6c3e8b240
+Revises: e4b7d2a9c815
+Create Date: 2026-10-18 20:07:33.518024
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1a6c3e8b240'
+down_revision = 'e4b7d2a9c815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Ключ S3 бывает до 1024 байт: один длинный ключ ронял всю синхронизацию на Postgres
+    with op.batch_alter_table('spaces_objects', schema=None) as batch_op:
+        batch_op.alter_column('key',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=1024),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('spaces_objects', schema=None) as batch_op:
+        batch_op.alter_column('key',
+               existing_type=sa.String(length=1024),
+               type_=sa.String(length=255),
+               existing_nullable=False)
@@ -11,17 +11,31 @@ class CountryCategory(db.Model):
 # Аудио
 class Audio(db.Model):
     __tablename__ = "audios"
+    __table_args__ = (
+        # Регистронезависимые фильтры API: func.lower(artist) == ...
+        db.Index("ix_audios_artist_lower", db.func.lower(db.text("artist"))),
+        db.Index("ix_audios_genre_lower", db.func.lower(db.text("genre"))),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, unique=True, index=True)
     original_name = db.Column(db.String(255))
     url = db.Column(db.String(255))
     artist = db.Column(db.String(100))
     genre = db.Column(db.String(100))
     price = db.Column(db.Integer, default=0)
     thumb_url = db.Column(db.String(255))
+    thumb_variants = db.Column(db.Text)  # JSON: {"webp": {"160": url, ...}, "avif": {...}}
+
+    # Заполняются при ingest (см. ingest_service)
+    duration = db.Column(db.Float)
+    bitrate = db.Column(db.Integer)
+    codec = db.Column(db.String(50))
+    waveform = db.Column(db.Text)  # JSON: список пиков 0–255
+    preview_url = db.Column(db.String(255))
+    ingested_at = db.Column(db.DateTime)
 
-    category_id = db.Column(db.Integer, db.ForeignKey("country_categories.id"))
+    category_id = db.Column(db.Integer, db.ForeignKey("country_categories.id"), index=True)
 
 
 # Видео
@@ -30,8 +44,60 @@ class Video(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     original_name = db.Column(db.String(255))
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, unique=True, index=True)
     url = db.Column(db.String(255))
     title = db.Column(db.String(255))
 
-    category_id = db.Column(db.Integer, db.ForeignKey("country_categories.id"))
+    # Заполняются при ingest (см. ingest_service)
+    duration = db.Column(db.Float)
+    bitrate = db.Column(db.Integer)
+    codec = db.Column(db.String(50))
+    ingested_at = db.Column(db.DateTime)
+
+    # HLS-упаковка (см. hls_service)
+    hls_manifest = db.Column(db.String(255))  # ключ master.m3u8 в Spaces
+    hls_packaged_at = db.Column(db.DateTime)
+
+    category_id = db.Column(db.Integer, db.ForeignKey("country_categories.id"), index=True)
+
+
+# Состояние синхронизации бакета с БД
+class SyncState(db.Model):
+    __tablename__ = "sync_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    last_synced_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
+    objects_seen = db.Column(db.Integer, default=0)
+    locked_until = db.Column(db.DateTime)  # проход занят процессом до этого времени
+
+
+# Состояние каждого ключа в бакете (для инкрементальной синхронизации)
+class SpacesObject(db.Model):
+    __tablename__ = "spaces_objects"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(1024), nullable=False, unique=True)  # ключ S3 — до 1024 байт
+    etag = db.Column(db.String(100))
+    size = db.Column(db.BigInteger)
+    last_modified = db.Column(db.DateTime)
+    deleted_at = db.Column(db.DateTime)  # tombstone: ключ пропал из бакета
+
+
+# Версия каталога витрины: увеличивается при каждом изменении в админке
+class CatalogueVersion(db.Model):
+    __tablename__ = "catalogue_version"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime)
+
+
+# Одноразовые токены на скачивание
+class DownloadToken(db.Model):
+    __tablename__ = "download_tokens"
+
+    token = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
@@ -0,0 +1,129 @@
+import os
+import time
+import hashlib
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+from config import db
+from models import CatalogueVersion
+
+try:
+    import redis
+except ImportError:  # общий бэкенд необязателен
+    redis = None
+
+
+# ==== Настройки ====
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", "300"))  # секунд
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "256"))
+PAGE_CACHE_REDIS_URL = os.getenv("PAGE_CACHE_REDIS_URL")
+
+
+# ==== Версия каталога ====
+def get_catalogue_version():
+    """
+    :return: (версия, время последнего изменения)
+    """
+    row = db.session.get(CatalogueVersion, 1)
+    if row is None:
+        return 0, None
+    return row.version, row.updated_at
+
+
+def bump_catalogue_version():
+    """
+    Увеличивает версию каталога. Не коммитит — изменение уходит
+    в той же транзакции, что и правка в админке.
+    Строку id=1 создаёт миграция, здесь только UPDATE
+    """
+    now = datetime.utcnow().replace(microsecond=0)
+    db.session.query(CatalogueVersion).filter_by(id=1).update(
+        {"version": CatalogueVersion.version + 1, "updated_at": now},
+        synchronize_session=False
+    )
+
+
+# ==== Кэш отрендеренных страниц ====
+class LocalPageCache:
+    """LRU-кэш в памяти процесса"""
+
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES, ttl=PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class RedisPageCache:
+    """Общий для всех воркеров и инстансов кэш в Redis"""
+
+    def __init__(self, url, ttl=PAGE_CACHE_TTL):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        try:
+            raw = self.client.get(f"page:{key}")
+        except redis.RedisError:
+            return None
+        if raw is None:
+            return None
+        etag, _, body = raw.partition(b"\n")
+        return etag.decode(), body
+
+    def set(self, key, value):
+        etag, body = value
+        try:
+            self.client.set(f"page:{key}", etag.encode() + b"\n" + body, ex=self.ttl)
+        except redis.RedisError:
+            pass
+
+
+def _make_cache():
+    if PAGE_CACHE_REDIS_URL and redis is not None:
+        return RedisPageCache(PAGE_CACHE_REDIS_URL)
+    return LocalPageCache()
+
+
+page_cache = _make_cache()
+
+
+def page_key(name, version, query):
+    digest = hashlib.sha1(query.encode("utf-8")).hexdigest()
+    return f"{name}:{version}:{digest}"
+
+
+def get_or_render(name, version, query, render):
+    """
+    :param render: функция без аргументов, возвращающая HTML
+    :return: (etag, body в байтах)
+    """
+    key = page_key(name, version, query)
+    cached = page_cache.get(key)
+    if cached is not None:
+        return cached
+
+    body = render().encode("utf-8")
+    value = (hashlib.sha1(body).hexdigest(), body)
+    page_cache.set(key, value)
+    return value
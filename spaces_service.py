@@ -1,42 +1,167 @@
 import threading
 import os
-import boto3
+import time
 import urllib.parse
-from dotenv import load_dotenv
-from models import Audio, Video, CountryCategory
+from datetime import datetime
+from models import Audio, Video, SpacesObject
 from config import db
+from page_cache import bump_catalogue_version
 
 
 # Заглушка для старых вызовов isAlive()
 if not hasattr(threading.Thread, "isAlive"):
     threading.Thread.isAlive = threading.Thread.is_alive
 
-load_dotenv()
-
 # ==== Переменные окружения ====
+# .env загружает create_app() до импорта сервисов; проверка — при создании
+# клиента, чтобы импорт (и `flask db ...`) не требовал ключей Spaces
 SPACES_KEY = os.getenv("SPACES_KEY")
 SPACES_SECRET = os.getenv("SPACES_SECRET")
 SPACES_REGION = os.getenv("SPACES_REGION", "fra1")
 SPACES_BUCKET = os.getenv("SPACES_BUCKET")
 SPACES_ENDPOINT = os.getenv("SPACES_ENDPOINT")   # должен быть https://fra1.digitaloceanspaces.com
 
-# Проверка переменных
-if not all([SPACES_KEY, SPACES_SECRET, SPACES_BUCKET, SPACES_ENDPOINT]):
-    raise ValueError("❌ Не все переменные окружения заданы в .env!")
+# ==== Настройки клиента ====
+SPACES_MAX_POOL = int(os.getenv("SPACES_MAX_POOL", "50"))
+SPACES_CONNECT_TIMEOUT = float(os.getenv("SPACES_CONNECT_TIMEOUT", "5"))
+SPACES_READ_TIMEOUT = float(os.getenv("SPACES_READ_TIMEOUT", "60"))
+SPACES_MAX_ATTEMPTS = int(os.getenv("SPACES_MAX_ATTEMPTS", "5"))  # включая первую попытку
+
+
+# ==== Метрики S3 (на процесс) ====
+_metrics = {}
+_metrics_lock = threading.Lock()
+_call_listeners = []
+
+
+def add_call_listener(listener):
+    """listener(operation, seconds, error) — после каждой операции S3 (см. instrumentation.py)"""
+    _call_listeners.append(listener)
+
+
+def _before_call(model, context, **kwargs):
+    context["_operation"] = model.name
+    context["_started"] = time.perf_counter()
+
+
+def _record(context, error):
+    started = context.get("_started")
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    with _metrics_lock:
+        m = _metrics.setdefault(context["_operation"], {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        m["count"] += 1
+        m["errors"] += int(error)
+        m["total_seconds"] += elapsed
+        m["max_seconds"] = max(m["max_seconds"], elapsed)
+    for listener in _call_listeners:
+        listener(context["_operation"], elapsed, error)
+
+
+def _after_call(context, **kwargs):
+    # Для get_object это время до заголовков ответа — тело читается потоком позже
+    _record(context, error=False)
+
+
+def _after_call_error(context, **kwargs):
+    _record(context, error=True)
+
+
+def get_s3_metrics():
+    """
+    Задержки операций S3 в этом процессе
+    :return: {"GetObject": {"count", "errors", "total_seconds", "max_seconds", "avg_seconds"}, ...}
+    """
+    with _metrics_lock:
+        result = {op: dict(m) for op, m in _metrics.items()}
+    for m in result.values():
+        m["avg_seconds"] = round(m["total_seconds"] / m["count"], 6) if m["count"] else None
+    return result
+
 
 # ==== DigitalOcean Spaces S3 клиент ====
-session = boto3.session.Session()
-client = session.client(
-    "s3",
-    region_name=SPACES_REGION,
-    endpoint_url=SPACES_ENDPOINT,   # Используем правильный endpoint!
-    aws_access_key_id=SPACES_KEY,
-    aws_secret_access_key=SPACES_SECRET,
-)
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def _client_kwargs(config_cls):
+    """Общие параметры клиента для boto3 и aiobotocore"""
+    # Проверка переменных
+    if not all([SPACES_KEY, SPACES_SECRET, SPACES_BUCKET, SPACES_ENDPOINT]):
+        raise ValueError("❌ Не все переменные окружения заданы в .env!")
+
+    return dict(
+        region_name=SPACES_REGION,
+        endpoint_url=SPACES_ENDPOINT,   # Используем правильный endpoint!
+        aws_access_key_id=SPACES_KEY,
+        aws_secret_access_key=SPACES_SECRET,
+        config=config_cls(
+            max_pool_connections=SPACES_MAX_POOL,
+            connect_timeout=SPACES_CONNECT_TIMEOUT,
+            read_timeout=SPACES_READ_TIMEOUT,
+            retries={"mode": "adaptive", "total_max_attempts": SPACES_MAX_ATTEMPTS},
+            tcp_keepalive=True,
+        ),
+    )
+
+
+def register_metrics(new_client):
+    """Метрики операций (см. get_s3_metrics) для клиента boto3 или aiobotocore"""
+    events = new_client.meta.events
+    events.register("before-call.s3", _before_call)
+    events.register("after-call.s3", _after_call)
+    events.register("after-call-error.s3", _after_call_error)
+
+
+def create_client():
+    """Новый клиент с ограниченным пулом соединений, таймаутами и adaptive-ретраями"""
+    # boto3 импортируется ~100 мс — только когда клиент действительно нужен
+    import boto3
+    from botocore.config import Config as BotoConfig
+
+    session = boto3.session.Session()
+    new_client = session.client("s3", **_client_kwargs(BotoConfig))
+    register_metrics(new_client)
+    return new_client
+
+
+def create_async_client():
+    """
+    Асинхронный клиент (aiobotocore) для ASGI-режима с теми же настройками.
+    :return: асинхронный контекстный менеджер клиента или None, если aiobotocore не установлен
+    """
+    try:
+        from aiobotocore.session import get_session
+        from aiobotocore.config import AioConfig
+    except ImportError:  # aiobotocore необязателен, без него тело читает boto3 в потоках
+        return None
+
+    kwargs = _client_kwargs(AioConfig)
+    return get_session().create_client("s3", **kwargs)
+
+
+def get_client():
+    """
+    Клиент S3 текущего процесса. Создаётся при первом обращении, и заново
+    после fork (gunicorn --preload), чтобы воркеры не делили сокеты пула
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = create_client()
+                _client_pid = pid
+    return _client
+
 
 # ==== Расширения ====
 AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".aac", ".flac")
 VIDEO_EXTENSIONS = (".mp4", ".webm", ".mov", ".avi", ".mkv")
+# Производные файлы (превью, HLS, обложки) в каталог не попадают
+DERIVED_PREFIXES = ("previews/", "hls/", "covers/")
 
 
 # ==== Генерация публичной ссылки ====
@@ -45,6 +170,26 @@ def build_public_url(key):
 
 
 # ==== Загрузка файла ====
+# Загрузка через сервер идёт частями по 8 МБ — в памяти не больше
+# multipart_chunksize * max_concurrency, независимо от размера файла
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+MAX_UPLOAD_PARTS = 10000
+_transfer_config = None
+
+
+def get_transfer_config():
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+
+        _transfer_config = TransferConfig(
+            multipart_threshold=UPLOAD_PART_SIZE,
+            multipart_chunksize=UPLOAD_PART_SIZE,
+            max_concurrency=4,
+        )
+    return _transfer_config
+
+
 def upload_file(file_obj, filename):
     """
     Загружает файл в DigitalOcean Spaces
@@ -52,24 +197,125 @@ def upload_file(file_obj, filename):
     :param filename: имя файла, которое будет в Space
     :return: публичный URL файла
     """
-    client.upload_fileobj(file_obj, SPACES_BUCKET, filename, ExtraArgs={'ACL': 'public-read'})
+    get_client().upload_fileobj(
+        file_obj, SPACES_BUCKET, filename,
+        ExtraArgs={'ACL': 'public-read'}, Config=get_transfer_config()
+    )
     return f"https://{SPACES_BUCKET}.{SPACES_REGION}.digitaloceanspaces.com/{filename}"
 
+
+# ==== Прямая загрузка из браузера (multipart + presigned URL) ====
+def get_upload_part_size(size):
+    """Размер части: не меньше 8 МБ и не больше 10000 частей на файл"""
+    return max(UPLOAD_PART_SIZE, -(-size // MAX_UPLOAD_PARTS))
+
+
+def create_multipart_upload(filename, content_type=None):
+    """
+    :return: UploadId
+    """
+    extra = {"ContentType": content_type} if content_type else {}
+    resp = get_client().create_multipart_upload(
+        Bucket=SPACES_BUCKET, Key=filename, ACL="public-read", **extra
+    )
+    return resp["UploadId"]
+
+
+def get_presigned_part_url(filename, upload_id, part_number, expires_in=3600):
+    return get_client().generate_presigned_url(
+        "upload_part",
+        Params={
+            "Bucket": SPACES_BUCKET,
+            "Key": filename,
+            "UploadId": upload_id,
+            "PartNumber": part_number,
+        },
+        ExpiresIn=expires_in,
+    )
+
+
+def list_uploaded_parts(filename, upload_id):
+    """Уже загруженные части — для продолжения после обрыва"""
+    parts = []
+    paginator = get_client().get_paginator("list_parts")
+    for page in paginator.paginate(Bucket=SPACES_BUCKET, Key=filename, UploadId=upload_id):
+        for p in page.get("Parts", []):
+            parts.append({"PartNumber": p["PartNumber"], "ETag": p["ETag"], "Size": p["Size"]})
+    return parts
+
+
+def complete_multipart_upload(filename, upload_id, parts):
+    """
+    :param parts: [{"PartNumber": int, "ETag": str}, ...]
+    :return: публичный URL файла
+    """
+    get_client().complete_multipart_upload(
+        Bucket=SPACES_BUCKET,
+        Key=filename,
+        UploadId=upload_id,
+        MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+    )
+    return build_public_url(filename)
+
+
+def abort_multipart_upload(filename, upload_id):
+    get_client().abort_multipart_upload(Bucket=SPACES_BUCKET, Key=filename, UploadId=upload_id)
+
 # ==== Удаление файла ====
 def delete_object(filename):
     """
     Удаляет файл из Spaces
     :param filename: имя файла в Space
     """
-    client.delete_object(Bucket=SPACES_BUCKET, Key=filename)
+    get_client().delete_object(Bucket=SPACES_BUCKET, Key=filename)
 
 
+DELETE_BATCH_SIZE = 1000  # предел DeleteObjects на один запрос
+
+
+def delete_objects(filenames):
+    """
+    Удаляет файлы из Spaces пачками по DELETE_BATCH_SIZE ключей
+    :param filenames: список ключей
+    :return: {ключ: текст ошибки} для файлов, которые удалить не удалось
+    """
+    client = get_client()
+    errors = {}
+    for i in range(0, len(filenames), DELETE_BATCH_SIZE):
+        batch = filenames[i:i + DELETE_BATCH_SIZE]
+        try:
+            response = client.delete_objects(
+                Bucket=SPACES_BUCKET,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except Exception as e:
+            errors.update((key, str(e)) for key in batch)
+            continue
+        # В режиме Quiet ответ перечисляет только ошибки
+        for error in response.get("Errors", []):
+            errors[error["Key"]] = error.get("Message") or error.get("Code", "Ошибка")
+    return errors
+
+
+def delete_prefix(prefix, keep=()):
+    """
+    Удаляет все объекты под prefix, кроме лежащих под префиксами keep
+    :return: {ключ: текст ошибки} для файлов, которые удалить не удалось
+    """
+    keep = tuple(keep)
+    errors = {}
+    paginator = get_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SPACES_BUCKET, Prefix=prefix):
+        keys = [o["Key"] for o in page.get("Contents", []) if not (keep and o["Key"].startswith(keep))]
+        if keys:
+            errors.update(delete_objects(keys))
+    return errors
 
 
 # ==== Presigned URL ====
 def get_presigned_view_url(filename, expires_in=3600):
     try:
-        return client.generate_presigned_url(
+        return get_client().generate_presigned_url(
             "get_object",
             Params={"Bucket": SPACES_BUCKET, "Key": filename},
             ExpiresIn=expires_in,
@@ -79,77 +325,261 @@ def get_presigned_view_url(filename, expires_in=3600):
         return None
 
 
-# ==== Основной метод — загрузка аудио/видео из Spaces в БД ====
-def list_media(sync_spaces=True):
-    audios = []
-    videos = []
+_presigned_cache = {}
+_presigned_lock = threading.Lock()
+
+
+def get_cached_presigned_url(filename, expires_in=3600, margin=300):
+    """
+    Presigned URL, переиспользуемый до момента за margin секунд до истечения
+    :return: URL или None при ошибке подписи
+    """
+    now = time.time()
+    with _presigned_lock:
+        cached = _presigned_cache.get(filename)
+    if cached and cached[0] - margin > now:
+        return cached[1]
+
+    url = get_presigned_view_url(filename, expires_in=expires_in)
+    if url:
+        with _presigned_lock:
+            _presigned_cache[filename] = (now + expires_in, url)
+    return url
+
+
+def forget_presigned_url(filename):
+    with _presigned_lock:
+        _presigned_cache.pop(filename, None)
+
+
+# ==== Ссылка на CDN ====
+def build_cdn_url(key, cdn_base_url):
+    return f"{cdn_base_url.rstrip('/')}/{urllib.parse.quote(key)}"
+
+
+# ==== Сверка бакета с БД (вызывается фоновым воркером, см. sync_service) ====
+def _new_media_row(key, ext):
+    if key.startswith(DERIVED_PREFIXES):
+        return None, None
+    if ext in AUDIO_EXTENSIONS:
+        return Audio, {
+            "filename": key,
+            "url": build_public_url(key),
+            "artist": "Unknown",
+            "genre": "Unknown",
+            "price": 0,
+            "category_id": None,
+        }
+    if ext in VIDEO_EXTENSIONS:
+        return Video, {
+            "filename": key,
+            "url": build_public_url(key),
+            "title": os.path.splitext(os.path.basename(key))[0],
+            "category_id": None,
+        }
+    return None, None
+
+
+FILENAME_MAX = Audio.__table__.c.filename.type.length  # то же у Video
+IN_CHUNK = 500  # SQLite до 3.32 ограничивает запрос 999 параметрами
+
+
+def chunks(items, size=IN_CHUNK):
+    """Режет список для IN (...) под лимит параметров SQLite"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _key_column():
+    # list_objects_v2 отдаёт ключи в порядке байтов UTF-8: в SQLite так
+    # сравнивает BINARY по умолчанию, в Postgres нужна collation "C"
+    if db.session.get_bind().dialect.name == "postgresql":
+        return SpacesObject.key.collate("C")
+    return SpacesObject.key
 
-    # Получаем текущие записи из БД
-    db_audios = {a.filename: a for a in Audio.query.all()}
-    db_videos = {v.filename: v for v in Video.query.all()}
-    categories_map = {c.id: c.name for c in CountryCategory.query.all()}
+
+def _tombstone_range(page_keys, after, upto, now):
+    """
+    Помечает tombstone живые ключи из диапазона (after, upto], которых нет
+    на странице. Страницы идут по порядку ключей, поэтому в памяти только
+    одна страница, а не весь бакет
+    """
+    column = _key_column()
+    query = SpacesObject.query.with_entities(SpacesObject.id, SpacesObject.key) \
+        .filter(SpacesObject.deleted_at.is_(None))
+    if after is not None:
+        query = query.filter(column > after)
+    if upto is not None:
+        query = query.filter(column <= upto)
+    gone = [{"id": o.id, "deleted_at": now} for o in query if o.key not in page_keys]
+    if gone:
+        db.session.bulk_update_mappings(SpacesObject, gone)
+    return len(gone)
+
+
+def _reset_ingest(keys):
+    """Файл под тем же ключом заменён — метаданные, превью и HLS считаются заново"""
+    for chunk in chunks(keys):
+        Audio.query.filter(Audio.filename.in_(chunk)) \
+            .update({"ingested_at": None}, synchronize_session=False)
+        Video.query.filter(Video.filename.in_(chunk)) \
+            .update({"ingested_at": None, "hls_manifest": None, "hls_packaged_at": None},
+                    synchronize_session=False)
+
+
+def _sync_page(contents, after, stats, now):
+    """
+    Обрабатывает одну страницу list_objects_v2 (до 1000 ключей)
+    :param after: последний ключ предыдущей страницы (None для первой)
+    :return: последний ключ этой страницы
+    """
+    page = {}
+    for obj in contents:
+        last_modified = obj.get("LastModified")
+        if last_modified is not None and last_modified.tzinfo is not None:
+            last_modified = last_modified.replace(tzinfo=None)
+        page[obj["Key"]] = {
+            "etag": (obj.get("ETag") or "").strip('"'),
+            "size": obj.get("Size"),
+            "last_modified": last_modified,
+        }
+    last_key = contents[-1]["Key"]
+
+    known = {}
+    for chunk in chunks(list(page)):
+        for o in SpacesObject.query \
+                .with_entities(SpacesObject.id, SpacesObject.key, SpacesObject.etag,
+                               SpacesObject.last_modified, SpacesObject.deleted_at) \
+                .filter(SpacesObject.key.in_(chunk)):
+            known[o.key] = o
+
+    state_inserts, state_updates, replaced = [], [], []
+    for key, meta in page.items():
+        o = known.get(key)
+        if o is None:
+            state_inserts.append(dict(key=key, **meta))
+        elif o.deleted_at is not None or o.etag != meta["etag"] \
+                or o.last_modified != meta["last_modified"]:
+            state_updates.append(dict(id=o.id, deleted_at=None, **meta))
+            if o.etag != meta["etag"]:
+                replaced.append(key)
+
+    # Новые ключи, которых ещё нет в каталоге
+    media_inserts = {Audio: [], Video: []}
+    if state_inserts:
+        new_keys = [row["key"] for row in state_inserts]
+        in_catalog = set()
+        for chunk in chunks(new_keys):
+            in_catalog |= {a.filename for a in Audio.query.with_entities(Audio.filename)
+                           .filter(Audio.filename.in_(chunk))}
+            in_catalog |= {v.filename for v in Video.query.with_entities(Video.filename)
+                           .filter(Video.filename.in_(chunk))}
+        for key in new_keys:
+            if key in in_catalog:
+                continue
+            if len(key) > FILENAME_MAX:
+                # Ключ помним в spaces_objects, но в каталог (filename до 255) он не влезет
+                print(f"Синхронизация Spaces: ключ длиннее {FILENAME_MAX} символов пропущен: {key[:80]}…")
+                continue
+            model, row = _new_media_row(key, os.path.splitext(key)[1].lower())
+            if model is not None:
+                media_inserts[model].append(row)
+
+    if state_inserts:
+        db.session.bulk_insert_mappings(SpacesObject, state_inserts)
+    if state_updates:
+        db.session.bulk_update_mappings(SpacesObject, state_updates)
+    if replaced:
+        _reset_ingest(replaced)
+    for model, rows in media_inserts.items():
+        if rows:
+            db.session.bulk_insert_mappings(model, rows)
+
+    stats["seen"] += len(page)
+    stats["new"] += len(state_inserts)
+    stats["changed"] += len(state_updates)
+    stats["replaced"] += len(replaced)
+    stats["media_added"] += len(media_inserts[Audio]) + len(media_inserts[Video])
+    stats["deleted"] += _tombstone_range(page, after, last_key, now)
+    return last_key
+
+
+def sync_bucket():
+    """
+    Инкрементально сверяет бакет с БД: обходит все страницы list_objects_v2,
+    сравнивает ETag/LastModified с таблицей spaces_objects и пишет только
+    изменившиеся ключи. Пропавшие ключи помечаются tombstone (deleted_at),
+    записи каталога при этом не трогаются. Если ETag сменился, у записи
+    каталога сбрасывается ingested_at — метаданные считаются заново.
+    :return: количество объектов в бакете
+    """
+    stats = {"seen": 0, "new": 0, "changed": 0, "replaced": 0, "media_added": 0, "deleted": 0}
+    now = datetime.utcnow()
+    last_key = None
+
+    paginator = get_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SPACES_BUCKET):
+        contents = page.get("Contents", [])
+        if contents:
+            last_key = _sync_page(contents, last_key, stats, now)
+
+    # Ключи после последней страницы (или все, если бакет пуст)
+    stats["deleted"] += _tombstone_range((), last_key, None, now)
+
+    # Новые записи каталога, заменённые и пропавшие файлы — в той же
+    # транзакции меняем версию, чтобы витрина (снимок и кэш страниц) пересобралась
+    if stats["media_added"] or stats["replaced"] or stats["deleted"]:
+        bump_catalogue_version()
+    db.session.commit()
+    print(f"Синхронизация Spaces: объектов {stats['seen']}, новых {stats['new']}, "
+          f"изменено {stats['changed']}, заменено {stats['replaced']}, удалено {stats['deleted']}, "
+          f"добавлено в каталог {stats['media_added']}")
+    return stats["seen"]
+
+
+# ==== Основной метод — аудио/видео из БД ====
+def list_media(sync_spaces=False):
+    """
+    Возвращает аудио и видео из БД.
+    Бакет по умолчанию не опрашивается — это делает фоновый воркер синхронизации.
+    :param sync_spaces: сначала синхронно сверить бакет с БД
+    """
+    from catalogue_service import get_snapshot
 
     if sync_spaces:
-        # Получаем список объектов из DO Spaces
-        resp = client.list_objects_v2(Bucket=SPACES_BUCKET)
-        keys = [obj['Key'] for obj in resp.get('Contents', [])]
-
-        for key in keys:
-            ext = os.path.splitext(key)[1].lower()
-            if ext in AUDIO_EXTENSIONS and key not in db_audios:
-                # Добавляем новое аудио в БД
-                new_audio = Audio(
-                    filename=key,
-                    url=build_public_url(key),
-                    artist="Unknown",
-                    genre="Unknown",
-                    price=0,
-                    category_id=None
-                )
-                db.session.add(new_audio)
-                db_audios[key] = new_audio
-
-            elif ext in VIDEO_EXTENSIONS and key not in db_videos:
-                # Добавляем новое видео в БД
-                new_video = Video(
-                    filename=key,
-                    url=build_public_url(key),
-                    title=os.path.splitext(os.path.basename(key))[0],
-                    category_id=None
-                )
-                db.session.add(new_video)
-                db_videos[key] = new_video
-
-        db.session.commit()
-
-    # Подготавливаем списки для вывода
-    for a in db_audios.values():
-        audios.append({
-            "filename": a.filename,
-            "url": a.url,
-            "artist": a.artist,
-            "genre": a.genre,
-            "price": a.price,
-            "thumb_url": a.thumb_url,
-            "category_id": a.category_id,
-            "category_name": categories_map.get(a.category_id, "Без категории"),
-            'original_name': a.original_name,
-        })
-
-    for v in db_videos.values():
-        videos.append({
-            "filename": v.filename,
-            "url": v.url,
-            "title": v.title,
-            "category_id": v.category_id,
-            "category_name": categories_map.get(v.category_id, "Без категории"),
-            'original_name': v.original_name,
-        })
+        sync_bucket()
+
+    # Записи — из снимка каталога, без повторной выборки из БД. Синхронизация
+    # выше меняет версию каталога, поэтому снимок здесь уже пересобран
+    snapshot = get_snapshot()
+    categories_map = dict(snapshot.categories)
+
+    audios = [{
+        "filename": a.filename,
+        "url": a.url,
+        "artist": a.artist,
+        "genre": a.genre,
+        "price": a.price,
+        "thumb_url": a.thumb_url,
+        "category_id": a.category_id,
+        "category_name": categories_map.get(a.category_id, "Без категории"),
+        'original_name': a.original_name,
+    } for a in snapshot.audios]
+
+    videos = [{
+        "filename": v.filename,
+        "url": v.url,
+        "title": v.title,
+        "category_id": v.category_id,
+        "category_name": categories_map.get(v.category_id, "Без категории"),
+        'original_name': v.original_name,
+    } for v in snapshot.videos]
 
     print(f"Найдено аудио: {len(audios)}, видео: {len(videos)}")
     return audios, videos
     if __name__ == "__main__":
-        from main import app  # импортируем Flask-приложение для контекста
+        from main import create_app  # Flask-приложение для контекста
+        app = create_app()
 
 
     with app.app_context():
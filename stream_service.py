@@ -0,0 +1,307 @@
+import os
+import time
+import secrets
+import mimetypes
+import threading
+
+from werkzeug.wsgi import wrap_file
+
+import spaces_service
+from media_cache import block_cache
+
+
+# ==== Настройки ====
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(64 * 1024)))
+META_TTL = int(os.getenv("STREAM_META_TTL", "60"))  # секунд
+MAX_RANGES = 16
+
+# Режим отдачи /stream: proxy — байты идут через воркер,
+# presigned — 302 на presigned URL Spaces, cdn — 302 на CDN_BASE_URL
+STREAM_MODE = os.getenv("STREAM_MODE", "proxy").lower()
+CDN_BASE_URL = os.getenv("CDN_BASE_URL", "")
+PRESIGNED_TTL = int(os.getenv("STREAM_PRESIGNED_TTL", "3600"))
+PRESIGNED_MARGIN = int(os.getenv("STREAM_PRESIGNED_MARGIN", "300"))
+
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".ogg": "audio/ogg",
+    ".aac": "audio/aac",
+    ".flac": "audio/flac",
+    ".m4a": "audio/mp4",
+    ".mp4": "video/mp4",
+    ".webm": "video/webm",
+    ".mov": "video/quicktime",
+    ".avi": "video/x-msvideo",
+    ".mkv": "video/x-matroska",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+
+class ObjectNotFound(Exception):
+    pass
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+# ==== Тип контента по расширению ====
+def guess_content_type(key):
+    ext = os.path.splitext(key)[1].lower()
+    return CONTENT_TYPES.get(ext) or mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+# ==== Метаданные объекта (head_object с коротким кэшем) ====
+_meta_cache = {}
+_meta_lock = threading.Lock()
+
+
+def get_object_meta(key):
+    """
+    Размер и ETag объекта без скачивания тела
+    :return: {"size": int, "etag": str}
+    """
+    now = time.monotonic()
+    with _meta_lock:
+        cached = _meta_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    from botocore.exceptions import ClientError
+
+    try:
+        head = spaces_service.get_client().head_object(Bucket=spaces_service.SPACES_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            raise ObjectNotFound(key)
+        raise
+
+    meta = {"size": head["ContentLength"], "etag": head.get("ETag", "").strip('"')}
+    with _meta_lock:
+        _meta_cache[key] = (now + META_TTL, meta)
+    return meta
+
+
+def forget_object_meta(key):
+    with _meta_lock:
+        _meta_cache.pop(key, None)
+
+
+def forget_object(key):
+    """
+    Сбрасывает закэшированные метаданные и presigned URL ключа — после
+    удаления или перезаливки, чтобы промах блочного кэша не записал новые
+    байты под старым ETag. Кэши в памяти процесса: остальные воркеры
+    увидят изменения не позже META_TTL
+    """
+    forget_object_meta(key)
+    spaces_service.forget_presigned_url(key)
+
+
+# ==== Разбор заголовка Range (RFC 7233) ====
+def parse_range(header, size):
+    """
+    :return: список (start, end) включительно или None, если заголовок
+             отсутствует/синтаксически неверен (отдаём весь файл)
+    :raises RangeNotSatisfiable: ни один диапазон не попадает в файл
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+
+        if not first:
+            # суффикс: bytes=-500 — последние 500 байт
+            if not last:
+                return None
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            continue
+        end = int(last) if last else size - 1
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+
+def if_range_matches(if_range, etag):
+    """
+    If-Range: диапазон отдаём, только если объект не менялся. Сравнение
+    сильное — слабый ETag и дата (Last-Modified мы не отдаём) не совпадают
+    """
+    if not if_range:
+        return True
+    return bool(etag) and if_range.strip() == f'"{etag}"'
+
+
+# ==== Потоковая отдача тела ====
+def iter_object(key, start=None, end=None, meta=None):
+    """
+    Отдаёт тело объекта кусками, не держа файл в памяти.
+    Если известен ETag и включён дисковый кэш — через блочный кэш.
+    """
+    if meta and meta["etag"] and block_cache.enabled:
+        if meta["size"] == 0:
+            return
+        if start is None:
+            start, end = 0, meta["size"] - 1
+        yield from block_cache.iter_range(
+            key, meta["etag"], start, end, meta["size"],
+            lambda first, last: iter_origin(key, first, last)
+        )
+        return
+    yield from iter_origin(key, start, end)
+
+
+def iter_origin(key, start=None, end=None):
+    """Читает объект напрямую из Spaces кусками по STREAM_CHUNK_SIZE"""
+    params = {"Bucket": spaces_service.SPACES_BUCKET, "Key": key}
+    if start is not None:
+        params["Range"] = f"bytes={start}-{end}"
+    body = spaces_service.get_client().get_object(**params)["Body"]
+    try:
+        for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+            yield chunk
+    finally:
+        body.close()
+
+
+def iter_plan(key, meta, plan):
+    """Тело ответа по плану из plan_stream_response"""
+    for part in plan:
+        if isinstance(part, bytes):
+            yield part
+        else:
+            yield from iter_object(key, part[0], part[1], meta)
+
+
+def _part_header(boundary, content_type, start, end, size):
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+    ).encode()
+
+
+def multipart_length(ranges, size, content_type, boundary):
+    total = len(f"\r\n--{boundary}--\r\n".encode())
+    for start, end in ranges:
+        total += len(_part_header(boundary, content_type, start, end, size)) + end - start + 1
+    return total
+
+
+# ==== Редирект вместо проксирования ====
+def stream_redirect_url(key, mode=None):
+    """
+    :return: URL для 302 или None — тогда отдаём байты через прокси
+    """
+    mode = mode or STREAM_MODE
+    if mode == "cdn" and CDN_BASE_URL:
+        return spaces_service.build_cdn_url(key, CDN_BASE_URL)
+    if mode in ("presigned", "cdn"):
+        return spaces_service.get_cached_presigned_url(
+            key, expires_in=PRESIGNED_TTL, margin=PRESIGNED_MARGIN
+        )
+    return None
+
+
+# ==== Ответ для /stream/<key> ====
+def plan_stream_response(key, range_header, if_range=None):
+    """
+    Заголовки и план тела без чтения байтов. План — список кусков:
+    bytes (разделители multipart) или (start, end) объекта, (None, None) — весь
+    объект. По нему тело собирают и WSGI-генератор, и ASGI-режим
+    :param if_range: заголовок If-Range — если объект с тех пор заменён,
+        Range игнорируется и отдаётся весь объект (200)
+    :return: (meta, план, статус, заголовки)
+    :raises ObjectNotFound, RangeNotSatisfiable
+    """
+    meta = get_object_meta(key)
+    size = meta["size"]
+    content_type = guess_content_type(key)
+    headers = {"Accept-Ranges": "bytes"}
+    if meta["etag"]:
+        headers["ETag"] = f'"{meta["etag"]}"'
+
+    if not if_range_matches(if_range, meta["etag"]):
+        range_header = None
+    try:
+        ranges = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        headers["Content-Range"] = f"bytes */{size}"
+        raise RangeNotSatisfiable(headers)
+
+    if ranges is None:
+        headers["Content-Type"] = content_type
+        headers["Content-Length"] = str(size)
+        return meta, [(None, None)], 200, headers
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Type"] = content_type
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return meta, [(start, end)], 206, headers
+
+    boundary = secrets.token_hex(12)
+    headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+    headers["Content-Length"] = str(multipart_length(ranges, size, content_type, boundary))
+    plan = []
+    for start, end in ranges:
+        plan.append(_part_header(boundary, content_type, start, end, size))
+        plan.append((start, end))
+    plan.append(f"\r\n--{boundary}--\r\n".encode())
+    return meta, plan, 206, headers
+
+
+def open_cached_span(key, meta, plan):
+    """
+    Если тело ответа — один диапазон внутри одного блока кэша, отдаёт его файлом
+    :return: BlockSlice или None
+    """
+    if len(plan) != 1 or not (meta["etag"] and block_cache.enabled) or meta["size"] == 0:
+        return None
+    start, end = plan[0]
+    if start is None:
+        start, end = 0, meta["size"] - 1
+    return block_cache.open_range(key, meta["etag"], start, end)
+
+
+def build_stream_response(key, range_header, environ=None, if_range=None):
+    """
+    :param environ: WSGI environ — попадание в кэш отдаётся через wsgi.file_wrapper
+        (в gunicorn — sendfile, байты не проходят через Python)
+    :param if_range: заголовок If-Range, см. plan_stream_response
+    :return: (тело, статус, заголовки)
+    :raises ObjectNotFound, RangeNotSatisfiable
+    """
+    meta, plan, status, headers = plan_stream_response(key, range_header, if_range)
+    if environ is not None:
+        cached = open_cached_span(key, meta, plan)
+        if cached is not None:
+            return wrap_file(environ, cached, STREAM_CHUNK_SIZE), status, headers
+    return iter_plan(key, meta, plan), status, headers
@@ -0,0 +1,136 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from models import SyncState
+from spaces_service import sync_bucket
+from ingest_service import ingest_pending
+
+
+# ==== Настройки ====
+SYNC_NAME = "spaces"
+# Интервал фоновой синхронизации в секундах (0 — только ручной запуск)
+SYNC_INTERVAL = int(os.getenv("SPACES_SYNC_INTERVAL", "300"))
+# Сколько секунд проход считается занятым: если процесс упал посреди
+# синхронизации, следующий займёт проход после истечения
+SYNC_LEASE = int(os.getenv("SPACES_SYNC_LEASE", "1800"))
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+# ==== Водяной знак последней синхронизации ====
+def get_sync_state():
+    state = SyncState.query.filter_by(name=SYNC_NAME).first()
+    if state is None:
+        # Строку создаёт миграция; сюда попадаем, только если её удалили
+        try:
+            db.session.add(SyncState(name=SYNC_NAME, objects_seen=0))
+            db.session.commit()
+        except IntegrityError:
+            # Другой процесс создал её первым
+            db.session.rollback()
+        state = SyncState.query.filter_by(name=SYNC_NAME).one()
+    return state
+
+
+def claim_sync(interval=None):
+    """
+    Занимает проход синхронизации одним условным UPDATE: из воркеров
+    gunicorn, одновременно решивших, что пора, проходит ровно один
+    :param interval: не занимать, если синхронизировались меньше interval
+        секунд назад (None — ручной запуск, водяной знак не проверяется)
+    :return: True, если проход достался этому процессу
+    """
+    get_sync_state()
+    now = datetime.utcnow()
+    query = SyncState.query.filter(
+        SyncState.name == SYNC_NAME,
+        or_(SyncState.locked_until.is_(None), SyncState.locked_until < now),
+    )
+    if interval is not None:
+        query = query.filter(or_(
+            SyncState.last_synced_at.is_(None),
+            SyncState.last_synced_at <= now - timedelta(seconds=interval),
+        ))
+    claimed = query.update({"locked_until": now + timedelta(seconds=SYNC_LEASE)},
+                           synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+# ==== Один проход синхронизации ====
+def run_sync(interval=None):
+    """
+    Сверяет бакет с БД и обновляет водяной знак.
+    Должна вызываться внутри app_context.
+    :param interval: см. claim_sync
+    :return: True — успешно, False — ошибка, None — проход занят другим
+        процессом или ещё не пора
+    """
+    if not claim_sync(interval):
+        return None
+    try:
+        seen = sync_bucket()
+    except Exception as e:
+        db.session.rollback()
+        state = get_sync_state()
+        state.last_error = str(e)[:255]
+        state.locked_until = None
+        db.session.commit()
+        print(f"Ошибка синхронизации Spaces: {e}")
+        return False
+
+    state = get_sync_state()
+    state.last_synced_at = datetime.utcnow()
+    state.objects_seen = seen
+    state.last_error = None
+    state.locked_until = None
+    db.session.commit()
+    return True
+
+
+# ==== Фоновый воркер ====
+def _worker_loop(app, interval):
+    while True:
+        with app.app_context():
+            try:
+                # Водяной знак и занятость прохода общие для всех процессов —
+                # если другой воркер gunicorn уже синхронизирует или недавно
+                # синхронизировал бакет, этот проход пропускается
+                forced = _wakeup.is_set()
+                _wakeup.clear()
+                # Метаданные, превью и волну для новых файлов считает
+                # тот же процесс, что синхронизировал бакет
+                if run_sync(None if forced else interval):
+                    ingest_pending()
+            except Exception as e:
+                print(f"Воркер синхронизации: {e}")
+            finally:
+                db.session.remove()
+
+        _wakeup.wait(interval if interval > 0 else None)
+
+
+def start_sync_worker(app, interval=SYNC_INTERVAL):
+    """Запускает фоновый поток синхронизации (один на процесс)"""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        _worker = threading.Thread(
+            target=_worker_loop, args=(app, interval),
+            name="spaces-sync", daemon=True
+        )
+        _worker.start()
+        return _worker
+
+
+def trigger_sync():
+    """Будит воркер для внеочередной синхронизации"""
+    _wakeup.set()
@@ -0,0 +1,210 @@
+import os
+import io
+import json
+import hashlib
+import mimetypes
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+import spaces_service
+from config import db
+from models import Audio
+from page_cache import bump_catalogue_version
+from hls_service import IMMUTABLE_CACHE
+
+
+# ==== Настройки ====
+# Обложки лежат в Spaces под ключом из хэша содержимого: новый файл — новый
+# ключ, поэтому объект можно кэшировать навсегда (Cache-Control: immutable)
+COVER_PREFIX = "covers/"
+THUMB_WIDTHS = (160, 320, 640)
+THUMB_FORMATS = (("avif", "image/avif", 50), ("webp", "image/webp", 80))  # (формат, mime, качество)
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+# Размеры обложки на витрине: карточки ~240px, на мобильных — в два столбца
+THUMB_SIZES = "(max-width: 600px) 50vw, 240px"
+
+_executor = None
+
+
+def _get_executor():
+    # Пул создаётся лениво — уже после форка воркера gunicorn
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+    return _executor
+
+
+# ==== Хранение в Spaces ====
+def _put_cover(key, data, content_type):
+    spaces_service.get_client().put_object(
+        Bucket=spaces_service.SPACES_BUCKET, Key=key, Body=data,
+        ACL="public-read", ContentType=content_type, CacheControl=IMMUTABLE_CACHE,
+    )
+
+
+def _exists(key):
+    from botocore.exceptions import ClientError
+
+    try:
+        spaces_service.get_client().head_object(Bucket=spaces_service.SPACES_BUCKET, Key=key)
+        return True
+    except ClientError:
+        return False
+
+
+def store_cover(data, filename):
+    """
+    Загружает обложку в Spaces под ключом covers/<sha256><расширение>.
+    Одинаковые файлы получают один ключ и не загружаются повторно
+    :param data: содержимое файла
+    :param filename: исходное имя (нужно только расширение)
+    :return: публичный URL обложки
+    """
+    ext = os.path.splitext(filename)[1].lower() or ".jpg"
+    key = f"{COVER_PREFIX}{hashlib.sha256(data).hexdigest()[:32]}{ext}"
+    if not _exists(key):
+        content_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        _put_cover(key, data, content_type)
+    return spaces_service.build_public_url(key)
+
+
+def cover_key(thumb_url):
+    """Ключ обложки в Spaces по её URL (None для старых локальных /static/covers)"""
+    if not thumb_url:
+        return None
+    key = urllib.parse.urlsplit(thumb_url).path.lstrip("/")
+    return key if key.startswith(COVER_PREFIX) else None
+
+
+def _variant_keys(key):
+    stem, _ = os.path.splitext(key)
+    return [f"{stem}-{width}.{fmt}" for fmt, _, _ in THUMB_FORMATS for width in THUMB_WIDTHS]
+
+
+# ==== Генерация вариантов (выполняется в отдельном процессе) ====
+def generate_variants(key):
+    """
+    Создаёт уменьшенные копии обложки в AVIF/WebP и кладёт их в Spaces
+    рядом с оригиналом (ключ тоже выводится из хэша — они неизменяемы)
+    :return: {"webp": {"160": url, ...}, "avif": {...}}
+    """
+    from PIL import Image, ImageOps, features
+
+    body = spaces_service.get_client().get_object(Bucket=spaces_service.SPACES_BUCKET, Key=key)["Body"]
+    stem, _ = os.path.splitext(key)
+    variants = {}
+
+    with Image.open(io.BytesIO(body.read())) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        for fmt, mime, quality in THUMB_FORMATS:
+            if not features.check(fmt):
+                continue
+            for width in THUMB_WIDTHS:
+                # Не растягиваем маленькие обложки
+                if width > image.width and width != THUMB_WIDTHS[0]:
+                    continue
+                resized = image.copy()
+                resized.thumbnail((width, width * 4), Image.LANCZOS)
+                buf = io.BytesIO()
+                resized.save(buf, fmt.upper(), quality=quality)
+                variant_key = f"{stem}-{width}.{fmt}"
+                _put_cover(variant_key, buf.getvalue(), mime)
+                variants.setdefault(fmt, {})[str(width)] = spaces_service.build_public_url(variant_key)
+
+    return variants
+
+
+# ==== Удаление ====
+def _delete_local_cover(thumb_url):
+    # Обложки, сохранённые до переноса в Spaces (см. flask migrate-covers)
+    local_path = "." + thumb_url
+    if os.path.exists(local_path):
+        os.remove(local_path)
+    stem, _ = os.path.splitext(local_path)
+    for fmt, _, _ in THUMB_FORMATS:
+        for width in THUMB_WIDTHS:
+            path = f"{stem}-{width}.{fmt}"
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def delete_covers(thumb_urls):
+    """
+    Удаляет обложки, на которые больше не ссылается ни одна запись Audio
+    (одна обложка может быть общей у нескольких треков).
+    Вызывать после коммита, внутри app_context
+    """
+    thumb_urls = {u for u in thumb_urls if u}
+    if not thumb_urls:
+        return
+    in_use = {
+        url for (url,) in db.session.query(Audio.thumb_url)
+        .filter(Audio.thumb_url.in_(thumb_urls)).distinct()
+    }
+    keys = []
+    for url in thumb_urls - in_use:
+        if url.startswith("/static/"):
+            _delete_local_cover(url)
+        elif cover_key(url):
+            keys.append(cover_key(url))
+            keys.extend(_variant_keys(cover_key(url)))
+    if keys:
+        errors = spaces_service.delete_objects(keys)
+        for key, error in errors.items():
+            print(f"Ошибка удаления обложки {key}: {error}")
+
+
+# ==== srcset для шаблона ====
+def build_sources(thumb_variants):
+    """
+    :param thumb_variants: JSON из Audio.thumb_variants
+    :return: [{"type": "image/avif", "srcset": "url 160w, ..."}, ...]
+    """
+    if not thumb_variants:
+        return []
+    try:
+        variants = json.loads(thumb_variants)
+    except ValueError:
+        return []
+
+    sources = []
+    for fmt, mime, _ in THUMB_FORMATS:
+        by_width = variants.get(fmt)
+        if by_width:
+            srcset = ", ".join(f"{url} {w}w" for w, url in sorted(by_width.items(), key=lambda i: int(i[0])))
+            sources.append({"type": mime, "srcset": srcset})
+    return sources
+
+
+# ==== Постановка в очередь ====
+def schedule_cover_variants(app, audio_id, cover_url):
+    """
+    Генерирует варианты обложки в пуле процессов, не блокируя запрос,
+    и записывает их в Audio.thumb_variants
+    """
+    key = cover_key(cover_url)
+    if key is None:
+        return None
+
+    def on_done(future):
+        try:
+            variants = future.result()
+        except Exception as e:
+            print(f"Ошибка обработки обложки {cover_url}: {e}")
+            return
+
+        with app.app_context():
+            audio = db.session.get(Audio, audio_id)
+            # Обложку могли сменить, пока шла обработка
+            if audio is None or audio.thumb_url != cover_url:
+                return
+            audio.thumb_variants = json.dumps(variants)
+            bump_catalogue_version()
+            db.session.commit()
+
+    future = _get_executor().submit(generate_variants, key)
+    future.add_done_callback(on_done)
+    return future
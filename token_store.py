@@ -0,0 +1,109 @@
+import os
+import time
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+from config import db
+from models import DownloadToken
+
+try:
+    import redis
+except ImportError:  # Redis необязателен
+    redis = None
+
+
+# ==== Настройки ====
+# sql — таблица download_tokens (работает между воркерами и инстансами),
+# redis — TOKEN_STORE_REDIS_URL, local — словарь в памяти процесса (только для разработки)
+TOKEN_STORE = os.getenv("TOKEN_STORE", "sql").lower()
+TOKEN_STORE_REDIS_URL = os.getenv("TOKEN_STORE_REDIS_URL")
+DOWNLOAD_TOKEN_TTL = int(os.getenv("DOWNLOAD_TOKEN_TTL", "3600"))  # секунд
+PURGE_EVERY = 100  # чистить просроченные токены раз в N выдач
+
+
+class SqlTokenStore:
+    def __init__(self, ttl=DOWNLOAD_TOKEN_TTL):
+        self.ttl = ttl
+        self._issued = 0
+
+    def issue(self, filename):
+        token = secrets.token_urlsafe(16)
+        now = datetime.utcnow()
+        db.session.add(DownloadToken(
+            token=token, filename=filename, expires_at=now + timedelta(seconds=self.ttl)
+        ))
+        self._issued += 1
+        if self._issued % PURGE_EVERY == 0:
+            DownloadToken.query.filter(DownloadToken.expires_at <= now).delete(synchronize_session=False)
+        db.session.commit()
+        return token
+
+    def consume(self, token):
+        """
+        Одноразово забирает токен.
+        :return: имя файла или None, если токена нет, он истёк или уже использован
+        """
+        row = DownloadToken.query.with_entities(DownloadToken.filename, DownloadToken.expires_at) \
+            .filter_by(token=token).first()
+        if row is None:
+            return None
+
+        # Удалить токен сможет только один запрос — он и получает файл
+        deleted = DownloadToken.query.filter_by(token=token).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted != 1 or row.expires_at <= datetime.utcnow():
+            return None
+        return row.filename
+
+
+class RedisTokenStore:
+    def __init__(self, url, ttl=DOWNLOAD_TOKEN_TTL):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def issue(self, filename):
+        token = secrets.token_urlsafe(16)
+        self.client.set(f"dl:{token}", filename, ex=self.ttl)
+        return token
+
+    def consume(self, token):
+        value = self.client.getdel(f"dl:{token}")
+        return value.decode() if value is not None else None
+
+
+class LocalTokenStore:
+    def __init__(self, ttl=DOWNLOAD_TOKEN_TTL):
+        self.ttl = ttl
+        self._tokens = {}
+        self._lock = threading.Lock()
+
+    def issue(self, filename):
+        token = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._tokens) % PURGE_EVERY == 0:
+                for t in [t for t, (_, exp) in self._tokens.items() if exp <= now]:
+                    del self._tokens[t]
+            self._tokens[token] = (filename, now + self.ttl)
+        return token
+
+    def consume(self, token):
+        with self._lock:
+            entry = self._tokens.pop(token, None)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+
+def _make_store():
+    if TOKEN_STORE == "redis":
+        if redis is None or not TOKEN_STORE_REDIS_URL:
+            raise ValueError("❌ TOKEN_STORE=redis требует пакет redis и TOKEN_STORE_REDIS_URL")
+        return RedisTokenStore(TOKEN_STORE_REDIS_URL)
+    if TOKEN_STORE == "local":
+        return LocalTokenStore()
+    return SqlTokenStore()
+
+
+download_tokens = _make_store()
@@ -0,0 +1,882 @@
+import os
+import json
+
+from flask import (
+Blueprint, current_app, render_template, redirect, url_for,
+request, flash, jsonify, session, abort, Response
+)
+from flask_cors import cross_origin
+from werkzeug.utils import secure_filename
+
+
+# ---- Импорт моделей и сервисов ----
+
+from config import db
+from models import Audio, Video, CountryCategory
+from spaces_service import get_presigned_view_url, upload_file, delete_object, get_s3_metrics
+from spaces_service import (
+    create_multipart_upload, get_presigned_part_url, get_upload_part_size,
+    list_uploaded_parts, complete_multipart_upload, abort_multipart_upload
+)
+from stream_service import (
+    build_stream_response, stream_redirect_url, forget_object, ObjectNotFound, RangeNotSatisfiable
+)
+from media_cache import block_cache
+from catalogue_service import load_catalogue
+from page_cache import get_catalogue_version, bump_catalogue_version, get_or_render
+from bulk_service import run_bulk, BulkError
+from api_service import list_categories, list_audios, list_videos, list_admin_media, encode_json, ApiError
+from token_store import download_tokens
+from thumbnail_service import (
+    THUMB_SIZES, schedule_cover_variants, store_cover, delete_covers, generate_variants, cover_key
+)
+from ingest_service import ingest_pending, delete_previews
+from hls_service import HLS_PREFIX, cache_control_for, package_pending, prune_packages
+from sync_service import SYNC_INTERVAL, start_sync_worker, trigger_sync, run_sync, get_sync_state
+from instrumentation import render_metrics, metrics_authorized, profiler
+from db_routing import read_only, replica_reads
+
+# cli_group=None — команды остаются `flask sync-spaces`, без префикса
+bp = Blueprint("main", __name__, cli_group=None)
+
+# ---- Конфиг администратора ----
+
+MEDIA_TYPES = ("audio", "video")
+
+ADMIN_USER = os.getenv("ADMIN_USER", "admin")
+ADMIN_PASS = os.getenv("ADMIN_PASS", "neSko567___2341")
+
+# ---- Фоновая синхронизация Spaces -> БД ----
+
+@bp.before_app_request
+def ensure_sync_worker():
+    # Поток стартует при первом запросе уже в воркере gunicorn,
+    # а не при импорте (чтобы не мешать `flask db ...`)
+    if SYNC_INTERVAL > 0:
+        start_sync_worker(current_app._get_current_object())
+
+
+@bp.cli.command("sync-spaces")
+def sync_spaces_command():
+    """Однократно сверить бакет Spaces с БД"""
+    result = run_sync()
+    if result:
+        state = get_sync_state()
+        print(f"Синхронизировано: {state.objects_seen} объектов, {state.last_synced_at}")
+    elif result is None:
+        print("Синхронизация уже идёт в другом процессе")
+    else:
+        print("Синхронизация не удалась, см. sync_state.last_error")
+
+
+@bp.cli.command("ingest-media")
+def ingest_media_command():
+    """Извлечь метаданные, превью и волну для новых аудио/видео"""
+    total = 0
+    while True:
+        done = ingest_pending()
+        if not done:
+            break
+        total += done
+    print(f"Обработано записей: {total}")
+
+
+@bp.cli.command("package-hls")
+def package_hls_command():
+    """Нарезать видео без HLS на рендишены и выложить в Spaces"""
+    total = 0
+    while True:
+        done = package_pending()
+        if not done:
+            break
+        total += done
+    print(f"Обработано видео: {total}")
+
+
+@bp.cli.command("migrate-covers")
+def migrate_covers_command():
+    """Перенести обложки из static/covers в Spaces под ключи из хэша"""
+    moved = 0
+    for audio in Audio.query.filter(Audio.thumb_url.like("/static/%")).all():
+        local_path = "." + audio.thumb_url
+        if not os.path.exists(local_path):
+            print(f"Нет файла {local_path}, пропускаем")
+            continue
+        with open(local_path, "rb") as f:
+            thumb_url = store_cover(f.read(), local_path)
+        old_thumb_url, audio.thumb_url = audio.thumb_url, thumb_url
+        audio.thumb_variants = json.dumps(generate_variants(cover_key(thumb_url)))
+        bump_catalogue_version()
+        db.session.commit()
+        delete_covers([old_thumb_url])
+        moved += 1
+    print(f"Перенесено обложек: {moved}")
+
+# ---- Флаги стран ----
+
+COUNTRY_CODES = {
+    "Россия": "ru",
+    "Турция": "tr",
+    "США": "us",
+    "Германия": "de",
+    "Франция": "fr",
+    "Италия": "it",
+    "Испания": "es",
+    "Португалия": "pt",
+    "Украина": "ua",
+    "Казахстан": "kz",
+    "Беларусь": "by",
+    "Польша": "pl",
+    "Чехия": "cz",
+    "Словакия": "sk",
+    "Сербия": "rs",
+    "Хорватия": "hr",
+    "Босния и Герцеговина": "ba",
+    "Словения": "si",
+    "Швейцария": "ch",
+    "Австрия": "at",
+    "Нидерланды": "nl",
+    "Бельгия": "be",
+    "Люксембург": "lu",
+    "Великобритания": "gb",
+    "Ирландия": "ie",
+    "Дания": "dk",
+    "Швеция": "se",
+    "Норвегия": "no",
+    "Финляндия": "fi",
+    "Эстония": "ee",
+    "Латвия": "lv",
+    "Литва": "lt",
+    "Грузия": "ge",
+    "Армения": "am",
+    "Азербайджан": "az",
+    "Узбекистан": "uz",
+    "Таджикистан": "tj",
+    "Киргизия": "kg",
+    "Туркменистан": "tm",
+    "Китай": "cn",
+    "Япония": "jp",
+    "Южная Корея": "kr",
+    "Индия": "in",
+    "Пакистан": "pk",
+    "Афганистан": "af",
+    "Иран": "ir",
+    "Ирак": "iq",
+    "Саудовская Аравия": "sa",
+    "ОАЭ": "ae",
+    "Катар": "qa",
+    "Бахрейн": "bh",
+    "Кувейт": "kw",
+    "Египет": "eg",
+    "Марокко": "ma",
+    "Тунис": "tn",
+    "Алжир": "dz",
+    "ЮАР": "za",
+    "Бразилия": "br",
+    "Аргентина": "ar",
+    "Чили": "cl",
+    "Мексика": "mx",
+    "Канада": "ca",
+    "Австралия": "au",
+    "Новая Зеландия": "nz",
+    "Болгария":"bg"
+}
+
+
+@bp.route("/")
+@read_only
+def index():
+    query = request.args.get("q", "").strip().lower()
+
+    # Страница одинакова для всех, пока админ ничего не изменил,
+    # поэтому рендер кэшируется по (версия каталога, запрос)
+    version, updated_at = get_catalogue_version()
+
+    def render():
+        # Страны с медиа — из снимка каталога этой версии
+        result = load_catalogue(query, version)
+        total_matches = sum(len(c.audios) + len(c.videos) for c in result)
+        no_results = (total_matches == 0 and query != "")
+
+        return render_template(
+            "index.html",
+            categories=result,
+            query=query,
+            country_code=COUNTRY_CODES,
+            thumb_sizes=THUMB_SIZES,
+            no_results=no_results
+        )
+
+    etag, body = get_or_render("index", version, query, render)
+
+    response = Response(body, mimetype="text/html")
+    response.set_etag(etag)
+    if updated_at:
+        response.last_modified = updated_at
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# ---- JSON API каталога ----
+
+def api_response(payload, status=200):
+    body, encoding = encode_json(payload, request.headers.get("Accept-Encoding"))
+    response = Response(body, status, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if status == 200:
+        response.add_etag()
+        response.cache_control.public = True
+        response.cache_control.max_age = 60
+        return response.make_conditional(request)
+    return response
+
+
+def api_list(loader):
+    try:
+        return api_response(loader(request.args))
+    except ApiError as e:
+        return api_response({"error": str(e)}, 400)
+
+
+@bp.route("/api/categories")
+@read_only
+def api_categories():
+    return api_list(list_categories)
+
+
+@bp.route("/api/audios")
+@read_only
+def api_audios():
+    return api_list(list_audios)
+
+
+@bp.route("/api/videos")
+@read_only
+def api_videos():
+    return api_list(list_videos)
+
+@cross_origin()
+@bp.route("/stream/<path:key>")
+def stream(key):
+    redirect_url = stream_redirect_url(key)
+    if redirect_url:
+        return redirect(redirect_url, 302)
+
+    try:
+        body, status, headers = build_stream_response(
+            key, request.headers.get("Range"), request.environ, request.headers.get("If-Range")
+        )
+    except ObjectNotFound:
+        abort(404)
+    except RangeNotSatisfiable as e:
+        return Response(b"", 416, headers=e.args[0])
+
+    # Тело идёт генератором кусками — файл целиком в память воркера не грузится
+    return Response(body, status, headers=headers, direct_passthrough=True)
+@bp.route("/hls/<path:key>")
+def hls(key):
+    key = HLS_PREFIX + key
+
+    redirect_url = stream_redirect_url(key)
+    if redirect_url:
+        return redirect(redirect_url, 302)
+
+    try:
+        body, status, headers = build_stream_response(
+            key, request.headers.get("Range"), request.environ, request.headers.get("If-Range")
+        )
+    except ObjectNotFound:
+        abort(404)
+    except RangeNotSatisfiable as e:
+        return Response(b"", 416, headers=e.args[0])
+
+    # Сегменты лежат по уникальному пути упаковки — кэшируются навсегда
+    headers["Cache-Control"] = cache_control_for(key)
+    return Response(body, status, headers=headers, direct_passthrough=True)
+
+@bp.route("/fake-buy/<path:filename>", methods=["POST"])
+def fake_buy(filename):
+    audio = Audio.query.filter_by(filename=filename).first()
+
+    if not audio:
+        return jsonify({"success": False, "error": "Файл не найден"}), 404
+
+    # создаём одноразовый токен (общий для всех воркеров, с TTL)
+    token = download_tokens.issue(filename)
+
+    return jsonify({
+        "success": True,
+        "download_url": f"/download/{token}"
+    })
+def resolve_download(token):
+    """
+    Гасит одноразовый токен и подписывает временную ссылку на файл
+    (общая логика для WSGI-маршрута и ASGI-режима, см. media_asgi.py)
+    :return: (presigned URL, None) или (None, (текст, статус))
+    """
+    filename = download_tokens.consume(token)
+    if filename is None:
+        return None, ("⛔ Ссылка недействительна или уже использована.", 410)
+
+    # проверяем в БД (токен выше — только с основной: он мог быть выдан только что)
+    with replica_reads():
+        audio = Audio.query.filter_by(filename=filename).first()
+    if not audio:
+        # реплика могла ещё не получить только что загруженный трек
+        audio = Audio.query.filter_by(filename=filename).first()
+    if not audio:
+        return None, ("Файл не найден", 404)
+
+    # создаём временную ссылку
+    return get_presigned_view_url(filename, expires_in=3600), None
+
+
+@bp.route("/download/<token>")
+def download(token):
+    presigned_url, error = resolve_download(token)
+    if error:
+        return error
+
+    return redirect(presigned_url)
+
+@bp.route("/admin/login", methods=["GET", "POST"])
+def login():
+    if session.get("admin_logged_in"):
+        return redirect(url_for(".admin"))
+
+    next_url = request.args.get("next") or url_for(".admin")
+
+    if request.method == "POST":
+        user = request.form.get("username", "")
+        pw = request.form.get("password", "")
+
+        if user == ADMIN_USER and pw == ADMIN_PASS:
+            session["admin_logged_in"] = True
+            flash("Вход выполнен", "success")
+            return redirect(next_url)
+        else:
+            flash("Неверный логин или пароль", "error")
+            return redirect(url_for(".login"))
+
+    return render_template("login.html")
+
+@bp.route("/admin/logout")
+
+def logout():
+    session.pop("admin_logged_in", None)
+    flash("Вы вышли из админки", "success")
+    return redirect(url_for(".login"))
+def save_cover(thumb_file):
+    """Загружает обложку в Spaces (ключ — хэш содержимого) и возвращает её URL"""
+    if not thumb_file or not thumb_file.filename:
+        return None
+    return store_cover(thumb_file.read(), secure_filename(thumb_file.filename))
+
+
+def create_media_record(media_type, filename_safe, original_name, url, form, thumb_url=None):
+    """
+    Создаёт запись Audio/Video по полям формы загрузки (без коммита).
+    Имя файла уникально: повторная загрузка под тем же именем заменила
+    объект в Spaces, поэтому обновляем существующую запись
+    """
+    try:
+        category_id = int(form.get("category_id"))
+    except (TypeError, ValueError):
+        category_id = None
+
+    if media_type == "audio":
+        model = Audio
+    elif media_type == "video":
+        model = Video
+    else:
+        return None
+
+    record = model.query.filter_by(filename=filename_safe).first()
+    if record is None:
+        record = model(filename=filename_safe)
+        db.session.add(record)
+    else:
+        # Файл новый — метаданные и HLS считаются заново
+        record.ingested_at = None
+        if model is Video:
+            record.hls_manifest = None
+            record.hls_packaged_at = None
+
+    record.original_name = original_name
+    record.url = url
+    record.category_id = category_id
+
+    if media_type == "audio":
+        record.artist = form.get("artist") or "Unknown"
+        record.genre = form.get("genre") or "Unknown"
+        try:
+            record.price = int(float(form.get("price", "0")) * 100)
+        except:
+            record.price = 0
+        if thumb_url:
+            record.thumb_url = thumb_url
+            record.thumb_variants = None
+
+    else:
+        record.title = form.get("title") or original_name
+
+    return record
+
+def schedule_thumbnails(record):
+    """Варианты обложки (AVIF/WebP разных размеров) — в фоне, после коммита"""
+    if isinstance(record, Audio) and record.thumb_url and record.thumb_variants is None:
+        schedule_cover_variants(current_app._get_current_object(), record.id, record.thumb_url)
+
+@bp.route("/admin", methods=["GET", "POST"])
+def admin():
+    if not session.get("admin_logged_in"):
+        return redirect(url_for(".login"))
+
+    if request.method == "POST":
+        uploaded_file = request.files.get("file")
+
+        if not uploaded_file or not uploaded_file.filename:
+            flash("⚠️ Не выбран файл!", "error")
+            return redirect(url_for(".admin"))
+
+        original_name = request.form.get("original_name") or uploaded_file.filename
+        media_type = request.form.get("media_type")
+        if media_type not in MEDIA_TYPES:
+            flash("⚠️ Неверный тип файла!", "error")
+            return redirect(url_for(".admin"))
+        filename_safe = secure_filename(uploaded_file.filename)
+        # сохраняем оригинальное имя
+        url = upload_file(uploaded_file, filename_safe)
+        if not url:
+            flash("❌ Ошибка загрузки в облако!", "error")
+            return redirect(url_for(".admin"))
+        forget_object(filename_safe)
+
+        record = create_media_record(
+            media_type, filename_safe, original_name, url,
+            request.form, save_cover(request.files.get("thumb")) if media_type == "audio" else None
+        )
+
+        bump_catalogue_version()
+        db.session.commit()
+        schedule_thumbnails(record)
+        flash(f"✅ Файл '{original_name}' добавлен в базу!", "success")
+        return redirect(url_for(".admin"))
+
+    # --- Рендеринг страницы: списки медиа браузер подгружает из /admin/media ---
+    categories = CountryCategory.query.order_by(CountryCategory.id).all()
+
+    return render_template(
+        "admin.html",
+        ADMIN_USER=ADMIN_USER,
+        categories=categories,
+        category_options=[{"id": c.id, "name": c.name} for c in categories]
+    )
+
+@bp.route("/admin/media")
+def admin_media():
+    """Страница медиа для таблиц админки: ?type=audio|video&category_id=&artist=&q=&sort=&order=&cursor="""
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    try:
+        page = list_admin_media(request.args.get("type", "audio"), request.args)
+    except ApiError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    return jsonify({"success": True, **page})
+
+# ---- Прямая загрузка из браузера в Spaces (multipart) ----
+
+@bp.route("/admin/upload/init", methods=["POST"])
+def upload_init():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    filename_safe = secure_filename(request.form.get("filename", ""))
+    if not filename_safe:
+        return jsonify({"success": False, "message": "Не указано имя файла"})
+    try:
+        size = int(request.form.get("size", "0"))
+    except ValueError:
+        size = 0
+
+    try:
+        upload_id = create_multipart_upload(filename_safe, request.form.get("content_type"))
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Ошибка облака: {e}"})
+
+    return jsonify({
+        "success": True,
+        "key": filename_safe,
+        "upload_id": upload_id,
+        "part_size": get_upload_part_size(size),
+    })
+
+@bp.route("/admin/upload/parts", methods=["POST"])
+def upload_parts():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    key = request.form.get("key")
+    upload_id = request.form.get("upload_id")
+    if not key or not upload_id:
+        return jsonify({"success": False, "message": "Не указаны key и upload_id"}), 400
+    try:
+        numbers = [int(n) for n in request.form.get("part_numbers", "").split(",") if n]
+    except ValueError:
+        return jsonify({"success": False, "message": "Неверные номера частей"}), 400
+
+    return jsonify({
+        "success": True,
+        "urls": {n: get_presigned_part_url(key, upload_id, n) for n in numbers},
+    })
+
+@bp.route("/admin/upload/status")
+def upload_status():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    if not request.args.get("key") or not request.args.get("upload_id"):
+        return jsonify({"success": False, "message": "Не указаны key и upload_id"}), 400
+    try:
+        parts = list_uploaded_parts(request.args.get("key"), request.args.get("upload_id"))
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Загрузка не найдена: {e}"})
+
+    return jsonify({"success": True, "parts": parts})
+
+@bp.route("/admin/upload/complete", methods=["POST"])
+def upload_complete():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    key = request.form.get("key")
+    upload_id = request.form.get("upload_id")
+    media_type = request.form.get("media_type")
+    original_name = request.form.get("original_name") or key
+
+    if not key or not upload_id:
+        return jsonify({"success": False, "message": "Не указаны key и upload_id"}), 400
+    if media_type not in MEDIA_TYPES:
+        # Запись создать не из чего — не оставляем в Spaces объект без записи
+        try:
+            abort_multipart_upload(key, upload_id)
+        except Exception as e:
+            print(f"Не удалось отменить загрузку {key}: {e}")
+        return jsonify({"success": False, "message": "Неверный тип файла"}), 400
+    try:
+        parts = [
+            {"PartNumber": int(p["PartNumber"]), "ETag": p["ETag"]}
+            for p in json.loads(request.form.get("parts", "[]"))
+        ]
+    except (ValueError, KeyError, TypeError):
+        return jsonify({"success": False, "message": "Неверный список частей"}), 400
+
+    try:
+        url = complete_multipart_upload(key, upload_id, parts)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Ошибка завершения загрузки: {e}"})
+    forget_object(key)
+
+    record = create_media_record(
+        media_type, key, original_name, url,
+        request.form, save_cover(request.files.get("thumb")) if media_type == "audio" else None
+    )
+    bump_catalogue_version()
+    db.session.commit()
+    schedule_thumbnails(record)
+
+    return jsonify({"success": True, "message": f"✅ Файл '{original_name}' добавлен в базу!"})
+
+@bp.route("/admin/upload/abort", methods=["POST"])
+def upload_abort():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    if not request.form.get("key") or not request.form.get("upload_id"):
+        return jsonify({"success": False, "message": "Не указаны key и upload_id"}), 400
+    try:
+        abort_multipart_upload(request.form.get("key"), request.form.get("upload_id"))
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Ошибка: {e}"})
+
+    return jsonify({"success": True})
+
+@bp.route("/admin/sync", methods=["POST"])
+def admin_sync():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    start_sync_worker(current_app._get_current_object())
+    trigger_sync()
+    state = get_sync_state()
+
+    return jsonify({
+        "success": True,
+        "message": "Синхронизация запущена",
+        "last_synced_at": state.last_synced_at.isoformat() if state.last_synced_at else None,
+        "objects_seen": state.objects_seen,
+        "last_error": state.last_error,
+    })
+
+@bp.route("/admin/cache/stats")
+def cache_stats():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    return jsonify({"success": True, "cache": block_cache.snapshot()})
+
+@bp.route("/admin/s3/stats")
+def s3_stats():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    return jsonify({"success": True, "operations": get_s3_metrics()})
+
+@bp.route("/metrics")
+def metrics():
+    if not metrics_authorized(request.headers.get("Authorization")):
+        abort(401)
+
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@bp.route("/admin/profiler", methods=["GET", "POST"])
+def admin_profiler():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    if request.method == "POST":
+        action = request.form.get("action")
+        if action == "start":
+            try:
+                seconds = float(request.form.get("seconds", "30"))
+            except ValueError:
+                return jsonify({"success": False, "message": "Неверная длительность"})
+            if not profiler.start(seconds):
+                return jsonify({"success": False, "message": "Профайлер уже запущен"})
+            return jsonify({"success": True, "message": "Профайлер запущен"})
+        if action == "stop":
+            profiler.stop()
+            return jsonify({"success": True, "message": "Профайлер остановлен", "profile": profiler.report()})
+        return jsonify({"success": False, "message": "Неизвестное действие"})
+
+    # Профиль этого воркера: ?format=collapsed — стеки для flamegraph
+    if request.args.get("format") == "collapsed":
+        return Response(profiler.collapsed(), mimetype="text/plain")
+    return jsonify({"success": True, "profile": profiler.report()})
+
+@bp.route("/admin/category/add", methods=["POST"])
+def add_category():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    name = request.form.get("category_name", "").strip()
+    if not name:
+        return jsonify({"success": False, "message": "Название категории не может быть пустым!"})
+
+    exists = CountryCategory.query.filter_by(name=name).first()
+    if exists:
+        return jsonify({"success": False, "message": "Такая категория уже существует!"})
+
+    try:
+        new_cat = CountryCategory(name=name)
+        db.session.add(new_cat)
+        bump_catalogue_version()
+        db.session.commit()
+
+        return jsonify({
+            "success": True,
+            "message": "Категория добавлена!",
+            "category": {"id": new_cat.id, "name": new_cat.name}
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"Ошибка: {str(e)}"})
+
+@bp.route("/admin/category/delete", methods=["POST"])
+def delete_category():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    try:
+        cat_id = int(request.form.get("category_id"))
+        cat = CountryCategory.query.get(cat_id)
+
+        if not cat:
+            return jsonify({"success": False, "message": "Категория не найдена!"})
+
+        db.session.delete(cat)
+        bump_catalogue_version()
+        db.session.commit()
+        return jsonify({"success": True, "message": "Категория удалена!", "category_id": cat_id})
+    except Exception:
+        return jsonify({"success": False, "message": "Ошибка удаления категории!"})
+
+
+
+
+
+
+
+@bp.route("/admin/delete/<media_type>/<filename>", methods=["POST"])
+def delete_media(media_type, filename):
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Доступ запрещён"}), 401
+
+    if media_type == "audio":
+        record = Audio.query.filter_by(filename=filename).first()
+    elif media_type == "video":
+        record = Video.query.filter_by(filename=filename).first()
+    else:
+        return jsonify({"success": False, "message": "Неверный тип файла"})
+
+    if not record:
+        return jsonify({"success": False, "message": "Файл не найден в базе"})
+
+    try:
+        delete_object(filename)  # удаляем из Spaces
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Ошибка удаления из облака: {e}"})
+    forget_object(filename)
+
+    # удаляем запись из БД
+    thumb_url = record.thumb_url if media_type == "audio" else None
+    preview_url = record.preview_url if media_type == "audio" else None
+    db.session.delete(record)
+    bump_catalogue_version()
+    db.session.commit()
+    # обложку и превью аудио, HLS видео — после коммита, если они больше ничьи
+    if media_type == "audio":
+        delete_covers([thumb_url])
+        delete_previews([preview_url])
+    else:
+        prune_packages([filename])
+
+    return jsonify({"success": True, "message": f"'{filename}' удалён!"})
+
+@bp.route("/admin/media/bulk", methods=["POST"])
+def bulk_media():
+    """
+    Массовая операция: media_type, filenames (несколько значений),
+    operation (delete / set_category / set_price / set_genre), value
+    """
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    try:
+        results = run_bulk(
+            request.form.get("media_type"),
+            request.form.getlist("filenames"),
+            request.form.get("operation"),
+            request.form.get("value"),
+        )
+    except BulkError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    succeeded = sum(1 for r in results if r["success"])
+    return jsonify({
+        "success": succeeded == len(results),
+        "message": f"Готово: {succeeded} из {len(results)}",
+        "results": results,
+    })
+
+@bp.route("/admin/media/update", methods=["POST"])
+def update_media():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    media_type = request.form.get("media_type")
+    filename = request.form.get("filename")
+
+    if media_type == "audio":
+        record = Audio.query.filter_by(filename=filename).first()
+    elif media_type == "video":
+        record = Video.query.filter_by(filename=filename).first()
+    else:
+        return jsonify({"success": False, "message": "Неверный тип файла"})
+
+    if not record:
+        return jsonify({"success": False, "message": "Файл не найден"})
+
+    # --- Обновляем поля ---
+    old_thumb_url = None
+    if media_type == "audio":
+        record.artist = request.form.get("artist", record.artist)
+        record.genre = request.form.get("genre", record.genre)
+
+        try:
+            record.price = int(float(request.form.get("price", record.price)) * 100)
+        except:
+            pass
+
+        try:
+            record.category_id = int(request.form.get("category_id"))
+        except:
+            pass
+
+        # обновление обложки
+        thumb_url = save_cover(request.files.get("thumb"))
+        if thumb_url and thumb_url != record.thumb_url:
+            old_thumb_url = record.thumb_url
+            record.thumb_url = thumb_url
+            record.thumb_variants = None
+
+    elif media_type == "video":
+        record.title = request.form.get("title", record.title)
+        try:
+            record.category_id = int(request.form.get("category_id"))
+        except:
+            pass
+
+    bump_catalogue_version()
+    db.session.commit()
+    if media_type == "audio" and record.thumb_variants is None:
+        schedule_thumbnails(record)
+    # прежняя обложка — если на неё больше никто не ссылается
+    delete_covers([old_thumb_url])
+
+    return jsonify({"success": True, "message": "Обновлено!"})
+
+
+@bp.route("/admin/category/update", methods=["POST"])
+def update_category():
+    if not session.get("admin_logged_in"):
+        return jsonify({"success": False, "message": "Не авторизован"}), 401
+
+    cat_id = request.form.get("category_id")
+    new_name = request.form.get("category_name", "").strip()
+
+    if not cat_id or not new_name:
+        return jsonify({"success": False, "message": "Неверные данные!"})
+
+    category = CountryCategory.query.get(cat_id)
+
+    if not category:
+        return jsonify({"success": False, "message": "Категория не найдена!"})
+
+    # Проверяем уникальность имени
+    exists = CountryCategory.query.filter(
+        CountryCategory.id != cat_id,
+        CountryCategory.name == new_name
+    ).first()
+
+    if exists:
+        return jsonify({"success": False, "message": "Такая категория уже существует!"})
+
+    try:
+        category.name = new_name
+        bump_catalogue_version()
+        db.session.commit()
+
+        return jsonify({
+            "success": True,
+            "message": "Название обновлено!",
+            "category": {"id": category.id, "name": category.name}
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "message": f"Ошибка: {str(e)}"})